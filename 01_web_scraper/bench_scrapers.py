@@ -0,0 +1,197 @@
+"""
+End-to-end Scraper Benchmark
+
+Description:
+    Runs the DAAD and TOEFL scrapers end to end (fetch, parse, export) against
+    the local mock server and reports records per second and peak memory, so
+    fetch-concurrency and parsing changes can be measured without the network.
+
+    The mock server runs in its own process, and every scenario runs in a fresh
+    child process so its peak RSS is measured on its own.
+
+Usage:
+    python bench_scrapers.py --latency 0.02 --error-rate 0.01
+    python bench_scrapers.py --scenarios daad-concurrent toefl-concurrent --workers 16 -o results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import contextlib
+
+script_path = os.path.abspath(__file__)
+script_dir = os.path.dirname(script_path)
+
+SCENARIOS = ['daad-sequential', 'daad-concurrent', 'daad-enrich',
+             'toefl-sequential', 'toefl-concurrent', 'toefl-audio']
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_daad(args, fetcher):
+    sys.path.append(os.path.join(script_dir, 'daad_program_scraper'))
+    import daad_program_scraper as daad
+    import daad_enrich
+    from daad_export import open_exporter
+    from mock_server import SOLR_PATH
+
+    daad.search_url = args.base_url + SOLR_PATH + "search.json"
+    daad_enrich.detail_url_format = args.base_url + SOLR_PATH + "detail.json?id={}"
+    fields = list(daad.avaliable_data_id)
+    if args.child == 'daad-sequential':
+        pages = daad.crawl_sequential(fetcher)
+    else:
+        pages = daad.crawl_concurrent([{}], fetcher, args.workers)
+    pages = daad.unique_courses(pages)
+    if args.child == 'daad-enrich':
+        fields += [field for field in daad_enrich.ENRICH_FIELDS if field not in fields]
+        fetch_detail = daad_enrich.make_detail_fetcher(daad.make_detail_json_getter(fetcher))
+        pages = daad_enrich.enrich_pages(pages, fetch_detail, args.workers)
+    with open_exporter(os.path.join(args.out_dir, 'daad.csv'), fields) as exporter:
+        return daad.export_pages(pages, exporter)
+
+
+def run_toefl(args, fetcher):
+    sys.path.append(os.path.join(script_dir, 'toefl_audio_scraper'))
+    import toefl_audio_scraper as toefl
+    from toefl_store import ArticleStore
+    from toefl_audio import AudioDownloader
+    from concurrent.futures import ThreadPoolExecutor
+
+    toefl.root_url = args.base_url
+    if args.parser:
+        toefl.default_parser = args.parser
+    if args.child == 'toefl-audio':
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            audio_urls = toefl.collect_audio_urls(pool, fetcher, args.workers)
+        downloader = AudioDownloader(os.path.join(args.out_dir, 'audio'), fetcher, args.workers)
+        return downloader.download_all(audio_urls)[0]
+
+    store = ArticleStore(os.path.join(args.out_dir, 'tpo_articles.jsonl'))
+    if args.child == 'toefl-sequential':
+        links = toefl.get_read_links(fetcher)
+        articles = toefl.crawl_sequential(fetcher, links)
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            links = toefl.get_read_links(fetcher, pool)
+        articles = toefl.crawl_concurrent(fetcher, links, args.workers)
+    count = 0
+    for article in articles:
+        if article is not None:
+            store.append(article)
+            count += 1
+    toefl.write_text(store, links, os.path.join(args.out_dir, 'tpo.txt'))
+    store.close()
+    return count
+
+
+def run_child(args):
+    """Runs one scenario in this process and prints its result as the last line."""
+    sys.path.append(os.path.abspath(os.path.join(script_dir, '..')))
+    from common.fetch import Fetcher
+
+    fetcher = Fetcher(pool_size=2 * args.workers, rate=args.rate, retries=args.retries)
+    start = time.perf_counter()
+    # The scrapers log every page; keep the benchmark output to the result line
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if args.child.startswith('daad'):
+            records = run_daad(args, fetcher)
+        else:
+            records = run_toefl(args, fetcher)
+    elapsed = time.perf_counter() - start
+    metrics = fetcher.metrics.snapshot()
+    fetcher.close()
+    print("RESULT " + json.dumps({
+        'scenario': args.child, 'records': records, 'seconds': elapsed,
+        'records_per_sec': records / elapsed if elapsed else 0.0, 'peak_rss_mib': peak_rss_mib(),
+        'requests': metrics['requests'], 'retries': metrics['retries'], 'bytes': metrics['bytes'],
+    }))
+
+
+def start_mock(args):
+    command = [sys.executable, os.path.join(script_dir, 'mock_server.py'), '--port', '0',
+               '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+               '--courses', str(args.courses), '--articles', str(args.articles)]
+    if args.replay:
+        command += ['--replay', args.replay]
+    mock = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = mock.stdout.readline().strip()
+    if not line.startswith("Serving on "):
+        mock.kill()
+        raise RuntimeError("Mock server failed to start: {}".format(line))
+    return mock, line[len("Serving on "):]
+
+
+def run_scenario(args, scenario, base_url):
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    command = [sys.executable, script_path, '--child', scenario, '--base-url', base_url, '--out-dir', out_dir,
+               '--workers', str(args.workers), '--rate', str(args.rate), '--retries', str(args.retries)]
+    if args.parser:
+        command += ['--parser', args.parser]
+    try:
+        proc = subprocess.run(command, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    result_lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    if proc.returncode != 0 or not result_lines:
+        print(f"{scenario} failed:\n{proc.stderr.strip()}")
+        return None
+    return json.loads(result_lines[-1][len("RESULT "):])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end scraper benchmark against the local mock server")
+    parser.add_argument("--scenarios", nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests in concurrent scenarios")
+    parser.add_argument("--rate", type=float, default=0, help="Per-host request rate limit (0: unlimited)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--parser", choices=['lxml', 'strainer'], help="TOEFL parsing backend (default: the scraper's)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 503")
+    parser.add_argument("--courses", type=int, default=3000, help="Synthetic DAAD courses")
+    parser.add_argument("--articles", type=int, default=20, help="Synthetic TOEFL articles per list page")
+    parser.add_argument("--replay", help="HTTP cache directory of recorded responses to serve")
+    parser.add_argument("-o", "--output", help="Write the results as JSON")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        sys.exit(0)
+
+    mock, base_url = start_mock(args)
+    print(f"Mock server at {base_url} (latency {args.latency}s, error rate {args.error_rate})")
+    results = []
+    try:
+        print(f"{'scenario':<18}{'records':>9}{'seconds':>9}{'rec/s':>10}{'peak MiB':>10}{'requests':>10}{'retries':>9}")
+        for scenario in args.scenarios:
+            result = run_scenario(args, scenario, base_url)
+            if result is None:
+                continue
+            results.append(result)
+            peak = "n/a" if result['peak_rss_mib'] is None else "{:.1f}".format(result['peak_rss_mib'])
+            print(f"{scenario:<18}{result['records']:>9}{result['seconds']:>9.2f}{result['records_per_sec']:>10.1f}"
+                  f"{peak:>10}{result['requests']:>10}{result['retries']:>9}")
+    finally:
+        mock.terminate()
+        mock.wait()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
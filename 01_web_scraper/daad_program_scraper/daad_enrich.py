@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+DAAD Course Detail Enrichment
+
+Description:
+    Optional stage between crawling and export. The Solr list response only has
+    summary fields; this stage fetches the detail record of every collected
+    course on a bounded worker pool (shared fetcher, HTTP cache) and
+    merges selected detail fields into the course before it is exported.
+    A detail field replaces a list field of the same name, so the defaults
+    leave out `applicationDeadline`, which the list response already has.
+
+    Pages stream through: at most two pages of detail requests are in flight,
+    and enriched pages are yielded in input order as soon as they complete.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Detail endpoint and fields; both can be changed from the command line (--detail-url, --enrich-fields)
+detail_url_format = "https://www2.daad.de/deutschland/studienangebote/international-programmes/api/solr/en/detail.json?id={}"
+ENRICH_FIELDS = ['tuitionFees', 'languageRequirements', 'beginning', 'programmeDuration']
+
+
+def make_detail_fetcher(get_json, url_format=None):
+    """
+    Returns fetch_detail(course_id) -> dict or None.
+    `get_json(url)` does the request (the shared fetcher retries transient errors);
+    a course whose detail still fails is exported without the detail fields.
+    """
+    url_format = url_format or detail_url_format
+
+    def fetch_detail(course_id):
+        try:
+            return get_json(url_format.format(course_id))
+        except Exception as e:
+            print(f"Detail fetch failed for course {course_id}: {e}")
+            return None
+
+    return fetch_detail
+
+
+def enrich_pages(pages, fetch_detail, workers=8, fields=None):
+    """
+    Yields each page with its courses merged with `fields` from their detail records, in input order.
+    Other keys of a page are passed through unchanged.
+    """
+    fields = fields or ENRICH_FIELDS
+
+    def enrich(courses_data):
+        detail = fetch_detail(courses_data.get('id'))
+        if not isinstance(detail, dict):
+            return courses_data
+        # Some endpoints wrap the record, e.g. {"course": {...}}
+        if len(detail) == 1 and isinstance(next(iter(detail.values())), dict):
+            detail = next(iter(detail.values()))
+        merged = dict(courses_data)
+        merged.update({field: detail[field] for field in fields if field in detail})
+        return merged
+
+    def collect(json_data, futures):
+        return dict(json_data, courses=[future.result() for future in futures])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for json_data in pages:
+            pending.append((json_data, [pool.submit(enrich, c) for c in json_data['courses']]))
+            if len(pending) > 1:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
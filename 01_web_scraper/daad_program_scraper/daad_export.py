@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+DAAD Export Writers
+
+Description:
+    Streaming export stage for the DAAD scraper. Records (dicts) are written
+    incrementally, so memory stays bounded regardless of result size.
+
+Formats:
+    - csv:     csv.writer with proper quoting
+    - jsonl:   one JSON object per line
+    - parquet: compressed columnar file (requires pyarrow)
+    - arrow:   Arrow IPC file with compressed buffers (requires pyarrow)
+"""
+
+import csv
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Columnar formats are optional; csv/jsonl work with the standard library
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ['csv', 'jsonl', 'parquet', 'arrow']
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+
+class CsvExporter(object):
+    def __init__(self, path, fields):
+        self.fields = fields
+        self.__file = open(path, mode='w', encoding='utf-8', newline='')
+        self.__writer = csv.writer(self.__file, quoting=csv.QUOTE_ALL)
+        self.__writer.writerow(fields)
+
+    def write(self, record):
+        self.__writer.writerow([record.get(field, '') for field in self.fields])
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlExporter(object):
+    def __init__(self, path, fields):
+        self.fields = fields
+        self.__file = open(path, mode='w', encoding='utf-8')
+
+    def write(self, record):
+        self.__file.write(json.dumps({field: record.get(field, '') for field in self.fields}, ensure_ascii=False))
+        self.__file.write('\n')
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrowExporter(object):
+    """
+    Buffers up to `batch_size` records, then writes them as one record batch,
+    so at most one batch is held in memory. All columns are stored as strings.
+    """
+    def __init__(self, path, fields, fmt='parquet', batch_size=1000, compression='zstd'):
+        if pa is None:
+            raise ImportError("pyarrow is required for '{}' export (pip install pyarrow)".format(fmt))
+        self.fields = fields
+        self.batch_size = batch_size
+        self.__schema = pa.schema([(field, pa.string()) for field in fields])
+        self.__columns = {field: [] for field in fields}
+        self.__rows = 0
+        self.__sink = None
+        if fmt == 'parquet':
+            self.__writer = pq.ParquetWriter(path, self.__schema, compression=compression)
+        else:
+            self.__sink = pa.OSFile(path, 'wb')
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self.__writer = pa.ipc.new_file(self.__sink, self.__schema, options=options)
+
+    def write(self, record):
+        for field in self.fields:
+            value = record.get(field)
+            self.__columns[field].append(None if value is None else str(value))
+        self.__rows += 1
+        if self.__rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.__rows == 0:
+            return
+        batch = pa.record_batch([pa.array(self.__columns[field], pa.string()) for field in self.fields],
+                                schema=self.__schema)
+        self.__writer.write_batch(batch)
+        self.__columns = {field: [] for field in self.fields}
+        self.__rows = 0
+
+    def close(self):
+        self.flush()
+        self.__writer.close()
+        if self.__sink is not None:
+            self.__sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def guess_format(path):
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def open_exporter(path, fields, fmt=None):
+    """Returns a streaming exporter for `fmt` (guessed from the file extension if None)."""
+    fmt = fmt or guess_format(path)
+    if fmt == 'csv':
+        return CsvExporter(path, fields)
+    if fmt == 'jsonl':
+        return JsonlExporter(path, fields)
+    if fmt in ('parquet', 'arrow'):
+        return ArrowExporter(path, fields, fmt)
+    raise ValueError("Unknown export format: {}".format(fmt))
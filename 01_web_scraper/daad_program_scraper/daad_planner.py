@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+DAAD Crawl Planner
+
+Description:
+    Splits a broad search into shards along facets the Solr API already accepts
+    (degree, lang, bgn, modStd), so every shard fits in a shallow offset window
+    and deep `offset` paging (slow, possibly capped server-side) is never needed.
+
+    Splitting is recursive: a shard above the window is split on the next facet
+    whose shards are shown to cover all of its hits.
+    The first page of each candidate shard is fetched at full page size, so it
+    doubles as the shard's count probe and its first result page.
+
+    Coverage of a split:
+    - Disjoint facets (each course has exactly one value, e.g. its degree): the
+      shard totals must add up to the parent's total
+    - Multi-valued facets (e.g. a course taught in several languages): shards
+      overlap, so counts prove nothing; every page of the resulting shards is
+      fetched and the split is kept only if their unique ids number the
+      parent's total. Those pages are kept on the shards and not fetched again.
+
+    Subjects are not split on by default, as their value ids are not known;
+    pass them with --facet-values to add the facet.
+"""
+
+# Facets in split order, and the values to try for each one.
+# Values come from the DAAD search form; override with --facet-values when the form changes.
+FACETS = ['degree[]', 'lang[]', 'bgn[]', 'modStd[]']
+FACET_VALUES = {
+    'degree[]': [1, 2, 3, 4, 5],
+    'lang[]': [1, 2, 3, 4],
+    'bgn[]': [1, 2, 3],
+    'modStd[]': [1, 2, 3, 4, 5, 6, 7],
+}
+# Facets with exactly one value per course, whose shards cannot overlap
+DISJOINT_FACETS = {'degree[]'}
+
+
+class Shard(object):
+    def __init__(self, query, total, first):
+        self.query = query
+        self.total = total
+        self.first = first
+        # All result pages in offset order, once fetched to verify coverage
+        self.pages = None
+
+    def __repr__(self):
+        return "Shard({}, total={})".format(describe(self.query), self.total)
+
+
+def plan_shards(query, first, total, fetch_json, get_total_hits, pool, window=1000, facet_values=None,
+                page_size=100):
+    """
+    Returns a list of Shards covering `query` (whose first page and total are known),
+    each with at most `window` hits where the facets allow it.
+    Child shards of one split are probed in parallel on `pool`; `page_size` is
+    the page size `fetch_json` uses, to fetch whole shards when verifying coverage.
+    Facets given only in `facet_values` (e.g. subjects[]) are tried after FACETS.
+    """
+    facet_values = dict(FACET_VALUES, **(facet_values or {}))
+    facets = FACETS + [facet for facet in facet_values if facet not in FACETS]
+    return _split(Shard(query, total, first), facets, fetch_json, get_total_hits, pool, window, facet_values,
+                  page_size)
+
+
+def describe(query):
+    """Short form of a query for log lines: search text and facet filters only."""
+    return {key: value for key, value in query.items()
+            if (key == 'q' or key.endswith('[]')) and value not in (None, '', [])}
+
+
+def shard_ids(shards, fetch_json, pool, page_size):
+    """Unique course ids of the shards, fetching (and keeping) the pages of those not fetched yet."""
+    tasks = [(shard, offset) for shard in shards if shard.pages is None
+             for offset in range(page_size, shard.total, page_size)]
+    pages = pool.map(fetch_json, [shard.query for shard, _ in tasks], [offset for _, offset in tasks])
+    for shard in shards:
+        if shard.pages is None:
+            shard.pages = [shard.first]
+    for (shard, _), page in zip(tasks, pages):
+        shard.pages.append(page)
+    return {course.get('id') for shard in shards for page in shard.pages for course in page['courses']}
+
+
+def _split(shard, facets, fetch_json, get_total_hits, pool, window, facet_values, page_size):
+    if shard.total is None or shard.total <= window:
+        return [shard]
+    for n, facet in enumerate(facets):
+        # Restrict to the values the query already filters on, if any
+        values = shard.query.get(facet) or facet_values.get(facet, [])
+        if not isinstance(values, list):
+            values = [values]
+        if len(values) < 2:
+            continue
+
+        children = [dict(shard.query, **{facet: [value]}) for value in values]
+        firsts = list(pool.map(fetch_json, children, [0] * len(children)))
+        totals = [get_total_hits(first) for first in firsts]
+        if None in totals or sum(totals) < shard.total:
+            # Some hits match none of the known values; this facet would lose them
+            print(f"Facet {facet} does not cover all {shard.total} hits of {describe(shard.query)}, trying next facet.")
+            continue
+
+        shards = []
+        for child, first, total in zip(children, firsts, totals):
+            if total > 0:
+                shards.extend(_split(Shard(child, total, first), facets[n + 1:], fetch_json, get_total_hits,
+                                     pool, window, facet_values, page_size))
+        if facet in DISJOINT_FACETS and sum(totals) == shard.total:
+            return shards
+
+        # Overlapping shards: the counts add up to at least the total either way, so check the ids
+        unique = len(shard_ids(shards, fetch_json, pool, page_size))
+        if unique == shard.total:
+            return shards
+        print(f"Facet {facet} shards hold {unique} of the {shard.total} hits of {describe(shard.query)}, "
+              f"trying next facet.")
+
+    print(f"Warning: cannot split {describe(shard.query)} ({shard.total} hits) below window {window}, deep paging needed.")
+    return [shard]
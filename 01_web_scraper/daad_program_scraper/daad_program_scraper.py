@@ -13,58 +13,472 @@ Description:
 
 Techniques:
     - API Reverse Engineering (Solr JSON)
-    - Standard Library Usage (urllib)
-    - JSON to CSV Conversion
+    - Shared Fetch Layer (common/fetch): pooled session, per-host token bucket,
+      retries with jittered backoff and request metrics in every mode
+    - Streaming Export (daad_export): CSV, JSONL, Parquet or Arrow IPC,
+      with a configurable field list (--fields)
+    - Incremental Sync (--incremental, daad_store): SQLite index of content hashes
+      by course id; only new/changed/deleted courses are written to a delta file.
+      Deletions are only recorded after a crawl verified as complete (no skipped
+      pages, unique ids matching every query's reported total)
+    - Concurrent Pagination (--concurrent): total hit count from the first page,
+      remaining offsets fetched in parallel over a pooled keep-alive session,
+      capped by a per-host rate limit, written in offset order
+    - Shared On-disk HTTP Cache (--cache, --offline): re-running parsing/export
+      after a schema change does not refetch pages
+    - Multi-query Crawling (--query, --queries): several parameter sets crawled
+      in one run over a shared pool, merged with an in-memory id set so
+      overlapping programmes are written once
+    - Facet Sharding (--shard, daad_planner): broad queries are split along
+      Solr facets into shards within a shallow offset window, crawled in
+      parallel and checked against the unsharded total
+    - Detail Enrichment (--enrich, daad_enrich): detail records fetched per
+      course on a bounded pool sharing the crawl's fetcher and rate limit,
+      selected fields merged into the streamed export (with --incremental,
+      only into new/changed courses)
 """
 
-from urllib import request 
+from urllib.parse import urlencode, quote
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
-import time
 import re
 import os
+import sys
+
+from daad_export import open_exporter, EXPORT_FORMATS
+from daad_store import CourseStore
+from daad_planner import plan_shards
+from daad_enrich import make_detail_fetcher, enrich_pages, ENRICH_FIELDS
 
 script_path = os.path.abspath(__file__)
 script_dir = os.path.dirname(script_path)
 os.chdir(script_dir)
-def array2csv(arr) :
-    str1 = '\",\"'.join(arr)
-    str1 = '\"' + str1 + '\"'
-    return str1
+
+# --- Path Setup for the shared 'common' package ---
+sys.path.append(os.path.abspath(os.path.join(script_dir, '..', '..')))
+from common.http_cache import HttpCache, CacheMiss
+from common.fetch import Fetcher, ordered_map
+
+DEFAULT_CACHE_DIR = os.path.join(script_dir, '..', '.http_cache')
+# Optional HttpCache, enabled with --cache / --offline
+http_cache = None
 
 limit = 100
-file = open('daad.csv', mode = 'w+', encoding = 'utf-8')
+# Consecutive unreadable pages after which sequential paging gives up on a query
+MAX_SKIPPED_PAGES = 3
+# Default export fields; any key of a Solr course record can be selected with --fields
 avaliable_data_id = ['id', 'courseName', 'academy', 'applicationDeadline']
-file.write(array2csv(avaliable_data_id))
+# Keys the Solr response may use for the total number of hits
+total_hit_keys = ['numResults', 'numFound', 'total', 'count']
 # This is the url in 2022 June, which changed now.
 # url_fore = "https://www2.daad.de/deutschland/studienangebote/international-programmes/api/solr/en/search.json?cert=&admReq=&langExamPC=&langExamLC=&langExamSC=&degree%5B%5D=2&fos=6&langDeAvailable=&langEnAvailable=&lang%5B%5D=2&modStd%5B%5D=7&fee=&bgn%5B%5D=2&sort=4&dur=&subjects%5B%5D=49&q=&limit=10&offset="
-url_format = "https://www2.daad.de/deutschland/studienangebote/international-programmes/api/solr/en/search.json?cert=&admReq=&langExamPC=&langExamLC=&langExamSC=&degree%5B%5D=2&langDeAvailable=&langEnAvailable=&lang%5B%5D=2&lang%5B%5D=4&modStd%5B%5D=7&fee=1&sort=4&dur=&q=Computer%20Science&limit={}&offset={}&display=list&isElearning=&isSep="
-rst = []
-i = -1
-while True :
-    i += 1
-    time.sleep(0.5)
-    url = url_format.format(limit, i*limit)
-    response1 = request.urlopen(url)
-    # print(response1.read())
-    json_str = response1.read()
-    try :
-        json_data = json.loads(str(json_str, "utf-8"))
-        if (len(json_data['courses']) == 0) :
+search_url = "https://www2.daad.de/deutschland/studienangebote/international-programmes/api/solr/en/search.json"
+# Query parameters of the default search; a query given with --query/--queries overrides any of them.
+# List values are repeated (e.g. lang[]=2&lang[]=4).
+default_query = {
+    'cert': '', 'admReq': '', 'langExamPC': '', 'langExamLC': '', 'langExamSC': '',
+    'degree[]': [2], 'langDeAvailable': '', 'langEnAvailable': '', 'lang[]': [2, 4],
+    'modStd[]': [7], 'fee': 1, 'sort': 4, 'dur': '', 'q': 'Computer Science',
+    'display': 'list', 'isElearning': '', 'isSep': '',
+}
+
+
+def build_url(query, offset):
+    params = dict(default_query)
+    params.update(query)
+    params['limit'] = limit
+    params['offset'] = offset
+    return search_url + '?' + urlencode(params, doseq=True, quote_via=quote)
+
+
+def load_queries(query_texts, queries_file):
+    """Query parameter sets from --query texts and a JSON list in --queries; the default search if neither."""
+    queries = [{'q': text} for text in query_texts or []]
+    if queries_file:
+        with open(queries_file, 'r', encoding='utf-8') as f:
+            queries.extend(json.load(f))
+    return queries or [{}]
+
+
+def get_url(url, fetcher):
+    """Fetches through the HTTP cache when enabled; `fetcher.get` only runs on a miss."""
+    if http_cache is not None:
+        return http_cache.fetch(url, fetcher=fetcher.get)
+    return fetcher.get(url)
+
+
+def course_to_record(courses_data, fields):
+    """Selects `fields` from a Solr course and strips HTML tags and line breaks from text values."""
+    rst = {}
+    for pointer in fields:
+        value = courses_data.get(pointer)
+        if value is None or pointer == 'id':
+            rst[pointer] = value
+        else :
+            rst[pointer] = re.sub(r'<[^>]+>', '', str(value).replace('\n', ' ').replace('\r', ' '))
+    return rst
+
+
+def get_total_hits(json_data):
+    for key in total_hit_keys:
+        if isinstance(json_data.get(key), int):
+            return json_data[key]
+    return None
+
+
+class CrawlReport(object):
+    """What a crawl could not verify: skipped pages and queries whose unique ids miss their total."""
+    def __init__(self):
+        self.problems = []
+
+    def skip(self, url, reason):
+        self.problems.append("skipped {} ({})".format(url, reason))
+
+    def check_total(self, query, total, ids):
+        if total is None:
+            self.problems.append("total hit count of {} unknown".format(query or {}))
+        elif len(ids) != total:
+            self.problems.append("{} of {} unique courses collected for {}".format(len(ids), total, query or {}))
+
+    @property
+    def complete(self):
+        return not self.problems
+
+
+def export_pages(pages, exporter):
+    """Streams the courses of each page to the exporter as soon as the page arrives."""
+    count = 0
+    for i, json_data in enumerate(pages):
+        print(f"Page {i}: {len(json_data['courses'])} courses")
+        for courses_data in json_data['courses']:
+            exporter.write(course_to_record(courses_data, exporter.fields))
+            count += 1
+        exporter.flush()
+    return count
+
+
+def sync_pages(pages, store, delta, report, enrich=None):
+    """
+    Upserts every course into the store and writes only new/changed ones to the delta
+    exporter, followed by tombstones for courses not returned by this run if `report`
+    (filled by the crawl) shows it was complete.
+    `enrich` (pages -> pages, e.g. enrich_pages) runs on the new/changed courses only,
+    after they are compared with the store.
+    Courses without an id cannot be tracked; they are skipped and counted as 'no_id'.
+    Returns a dict of counts per operation.
+    """
+    fields = [field for field in delta.fields if field != 'op']
+    counts = {'new': 0, 'changed': 0, 'deleted': 0, 'unchanged': 0, 'no_id': 0}
+
+    def upserted(pages):
+        for i, json_data in enumerate(pages):
+            print(f"Page {i}: {len(json_data['courses'])} courses")
+            courses, ops = [], []
+            for courses_data in json_data['courses']:
+                if courses_data.get('id') is None:
+                    counts['no_id'] += 1
+                    continue
+                # Changes are detected on the whole Solr course, before enrichment and whatever --fields exports
+                op = store.upsert(courses_data)
+                if op is None:
+                    counts['unchanged'] += 1
+                    continue
+                counts[op] += 1
+                courses.append(courses_data)
+                ops.append(op)
+            yield dict(json_data, courses=courses, ops=ops)
+
+    store.begin_run()
+    try:
+        changed = upserted(pages)
+        if enrich is not None:
+            changed = enrich(changed)
+        for json_data in changed:
+            for courses_data, op in zip(json_data['courses'], json_data['ops']):
+                delta.write(dict(course_to_record(courses_data, fields), op=op))
+            delta.flush()
+        if counts['new'] + counts['changed'] + counts['unchanged'] == 0:
+            # An empty result is far more likely a broken query than every course disappearing
+            print("No courses returned, skipping tombstones.")
+        elif not report.complete:
+            # Courses on a skipped page would be reported as deleted
+            print("Crawl not verified as complete, skipping tombstones:\n" +
+                  "\n".join("- " + problem for problem in report.problems))
+        else:
+            for course_id in store.tombstone_missing():
+                counts['deleted'] += 1
+                delta.write({'op': 'deleted', 'id': course_id})
+    except BaseException:
+        store.rollback()
+        raise
+    store.commit()
+    return counts
+
+
+def unique_courses(pages):
+    """
+    Drops courses whose id was already yielded: programmes returned by several
+    queries, or by several facet shards of one query. Pages tagged with a
+    `query_index` have the two cases counted apart.
+    """
+    # id -> query_index of the page it was first seen on
+    seen = {}
+    across_queries = within_query = 0
+    for json_data in pages:
+        courses = []
+        query_index = json_data.get('query_index')
+        for courses_data in json_data['courses']:
+            course_id = courses_data.get('id')
+            if course_id in seen:
+                if seen[course_id] == query_index:
+                    within_query += 1
+                else:
+                    across_queries += 1
+                continue
+            seen[course_id] = query_index
+            courses.append(courses_data)
+        yield dict(json_data, courses=courses)
+    if across_queries:
+        print(f"Skipped {across_queries} duplicate courses across queries.")
+    if within_query:
+        print(f"Skipped {within_query} courses repeated within a query (overlapping facet shards).")
+
+
+def crawl_sequential(fetcher, query=None, start_page=0, report=None, ids=None, total=None):
+    """
+    Original mode: yields one page at a time until an empty page is returned.
+    Unreadable pages are skipped; the query stops after MAX_SKIPPED_PAGES of them in a row,
+    or once the skipped page is past the total hit count.
+    With `report`, skipped pages and the unique ids collected against the total are recorded.
+    """
+    ids = set() if ids is None else ids
+    i = start_page - 1
+    skipped = 0
+    while True :
+        if skipped >= MAX_SKIPPED_PAGES or (skipped and total is not None and (i + 1) * limit >= total):
+            print(f"Stopping query {query or {}} after {skipped} unreadable page(s) in a row.")
             break
-        for j in range(len(json_data['courses'])) :
-            courses_data = json_data['courses'][j]
-            print(i)
-            for pointer in avaliable_data_id:
-                # print(courses_data[pointer])
-                if (pointer == 'id') :
-                    rst.append(str(courses_data[pointer]))
-                else :
-                    rst.append(re.sub(r'<[^>]+>', '',str(courses_data[pointer]).replace('\n', ' ').replace('\r', ' ').replace('\"', '\'')))
-            file.write(array2csv(rst))
-            file.write('\n')
-            rst = []
-    except json.decoder.JSONDecodeError :
-        print (json_str)
-file.close()        
-    
-        
\ No newline at end of file
+        i += 1
+        url = build_url(query or {}, i*limit)
+        try:
+            response = get_url(url, fetcher)
+        except CacheMiss:
+            print(f"Offline: {url} is not in the HTTP cache, stopping this query.")
+            if report is not None:
+                report.skip(url, "not in the HTTP cache")
+            break
+        if response.status_code >= 400:
+            # Still failing after the fetcher's retries; the report keeps tombstones off
+            print(f"HTTP {response.status_code} for {url}, skipping the page.")
+            if report is not None:
+                report.skip(url, f"HTTP {response.status_code}")
+            skipped += 1
+            continue
+        json_str = response.content
+        try :
+            json_data = json.loads(str(json_str, "utf-8"))
+            if total is None:
+                total = get_total_hits(json_data)
+            if (len(json_data['courses']) == 0) :
+                break
+            ids.update(course.get('id') for course in json_data['courses'])
+            skipped = 0
+            yield json_data
+        except json.decoder.JSONDecodeError :
+            print (json_str)
+            if report is not None:
+                report.skip(url, "invalid JSON")
+            skipped += 1
+    if report is not None:
+        report.check_total(query, total, ids)
+
+
+def make_json_fetcher(fetcher, report=None):
+    """
+    Returns fetch_json(query, offset) going through the HTTP cache and the shared fetcher.
+    Pages that cannot be read are returned empty and recorded in `report`.
+    """
+    def skip(url, reason):
+        if report is not None:
+            report.skip(url, reason)
+        return {'courses': []}
+
+    def fetch_json(query, offset):
+        url = build_url(query, offset)
+        try:
+            response = get_url(url, fetcher)
+        except CacheMiss:
+            print(f"Offline: {url} is not in the HTTP cache, skipping the page.")
+            return skip(url, "not in the HTTP cache")
+        if response.status_code >= 400:
+            # Still failing after the fetcher's retries; as in sequential mode, the report decides
+            print(f"HTTP {response.status_code} for {url}, skipping the page.")
+            return skip(url, f"HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            print(response.content)
+            return skip(url, "invalid JSON")
+
+    return fetch_json
+
+
+def make_detail_json_getter(fetcher):
+    """Returns get_json(url) for detail records; HTTP errors (after the fetcher's retries) raise."""
+    def get_json(url):
+        response = get_url(url, fetcher)
+        response.raise_for_status()
+        return response.json()
+
+    return get_json
+
+
+def crawl_concurrent(queries, fetcher, workers=8, shard_window=None, facet_values=None, report=None):
+    """
+    Fetches the first page of every query in parallel to read the total hit
+    counts, then fetches all remaining (query, offset) pages through the shared
+    fetcher (pooled session, per-host rate limit). Pages are yielded in query and offset order from
+    a sliding window of at most 2 * workers in-flight requests, so output order
+    matches the sequential mode and memory stays bounded.
+
+    With `shard_window`, each query above the window is first split into facet
+    shards (daad_planner) and the shards are crawled instead; the unique ids
+    collected per query are then checked against its unsharded total.
+
+    With `report`, skipped pages and every query's unique ids against its total are recorded.
+    """
+    fetch_json = make_json_fetcher(fetcher, report)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        firsts = list(pool.map(fetch_json, queries, [0] * len(queries)))
+        totals = [get_total_hits(first) for first in firsts]
+        for query, total in zip(queries, totals):
+            print(f"Query {query}: {total if total is not None else 'unknown'} hits")
+
+        # (parent query index, query, pages fetched so far, total) for every unit to crawl
+        units = [(i, queries[i], [firsts[i]], totals[i]) for i in range(len(queries))]
+        if shard_window:
+            units = []
+            for i, total in enumerate(totals):
+                # Plan on the effective parameters so facets pinned by default_query stay pinned
+                shards = plan_shards(dict(default_query, **queries[i]), firsts[i], total, fetch_json,
+                                     get_total_hits, pool, shard_window, facet_values, limit)
+                print(f"Query {queries[i]}: {len(shards)} shards")
+                # Shards whose coverage was verified by id already hold all their pages
+                units.extend((i, shard.query, shard.pages or [shard.first], shard.total) for shard in shards)
+        parent_ids = [set() for _ in queries]
+
+        def fetch_page(unit, offset):
+            i, query, pages, _ = unit
+            page = offset // limit
+            return i, (pages[page] if page < len(pages) else fetch_json(query, offset))
+
+        tasks = ((unit, offset) for unit in units if unit[3] is not None
+                 for offset in range(0, unit[3], limit))
+        for i, json_data in ordered_map(pool, fetch_page, tasks, 2 * workers):
+            parent_ids[i].update(course.get('id') for course in json_data['courses'])
+            yield dict(json_data, query_index=i)
+
+    if shard_window:
+        for i, total in enumerate(totals):
+            if total is not None and len(parent_ids[i]) != total:
+                print(f"Warning: sharded crawl of {queries[i]} collected {len(parent_ids[i])} unique courses, "
+                      f"unsharded total is {total}.")
+            elif total is not None:
+                print(f"Sharded crawl of {queries[i]} verified: {total} unique courses.")
+    if report is not None:
+        for i, total in enumerate(totals):
+            if total is not None:
+                report.check_total(queries[i], total, parent_ids[i])
+
+    for i, total in enumerate(totals):
+        if total is None:
+            print(f"Total hit count not found for query {queries[i]}, falling back to sequential paging.")
+            if firsts[i]['courses']:
+                yield dict(firsts[i], query_index=i)
+                ids = set(course.get('id') for course in firsts[i]['courses'])
+                for json_data in crawl_sequential(fetcher, queries[i], start_page=1, report=report, ids=ids):
+                    yield dict(json_data, query_index=i)
+            elif report is not None:
+                report.check_total(queries[i], None, ())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DAAD International Programmes Scraper")
+    parser.add_argument("--concurrent", action='store_true', help="Fetch all pages concurrently after reading the total hit count")
+    parser.add_argument("--query", action='append', help="Search text (repeatable); other parameters keep their defaults")
+    parser.add_argument("--shard", action='store_true', help="Split broad queries into facet shards (implies --concurrent)")
+    parser.add_argument("--shard-window", type=int, default=1000, help="Max hits (deepest offset) per shard")
+    parser.add_argument("--facet-values", help="JSON file overriding the facet values tried by the planner")
+    parser.add_argument("--queries", help="JSON file with a list of query parameter sets, e.g. [{\"q\": \"Data Science\", \"degree[]\": [2]}]")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests (pooled connections)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Max requests per second per host (default: 5 concurrent, 2 sequential)")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of failed requests (jittered backoff)")
+    parser.add_argument("--enrich", action='store_true', help="Fetch each course's detail record and merge --enrich-fields into the export")
+    parser.add_argument("--enrich-fields", default=",".join(ENRICH_FIELDS), help="Comma-separated detail fields added by --enrich")
+    parser.add_argument("--detail-url", default=None, help="Detail endpoint with {} for the course id (default: daad_enrich.detail_url_format)")
+    parser.add_argument("--detail-workers", type=int, default=8, help="Concurrent detail requests for --enrich")
+    parser.add_argument("-o", "--output", default="daad.csv", help="Output file")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None, help="Export format (default: from output extension)")
+    parser.add_argument("--fields", default=",".join(avaliable_data_id), help="Comma-separated course fields to export")
+    parser.add_argument("--incremental", action='store_true', help="Sync against the local index and write only a delta file")
+    parser.add_argument("--store", default="daad_index.sqlite3", help="SQLite index used by --incremental")
+    parser.add_argument("--delta", default="daad_delta.csv", help="Delta output used by --incremental")
+    parser.add_argument("--cache", action='store_true', help="Cache responses on disk (shared with the TOEFL scraper)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="HTTP cache directory")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600, help="Cache entry lifetime in seconds")
+    parser.add_argument("--offline", action='store_true', help="Only read from the HTTP cache, never the network")
+    args = parser.parse_args()
+
+    if args.cache or args.offline:
+        http_cache = HttpCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline)
+
+    fields = [field.strip() for field in args.fields.split(",") if field.strip()]
+    queries = load_queries(args.query, args.queries)
+    facet_values = None
+    if args.facet_values:
+        with open(args.facet_values, 'r', encoding='utf-8') as f:
+            facet_values = json.load(f)
+    concurrent = args.concurrent or args.shard
+    if args.rate is None:
+        # Sequential mode keeps the original pace of one request per 0.5 s
+        args.rate = 5.0 if concurrent or args.enrich else 2.0
+    # One fetcher (pooled session, per-host limiter, metrics) shared by the crawl and the detail stage
+    fetcher = Fetcher(pool_size=args.workers + (args.detail_workers if args.enrich else 0),
+                      rate=args.rate, retries=args.retries)
+    report = CrawlReport()
+    if concurrent:
+        pages = crawl_concurrent(queries, fetcher, args.workers,
+                                 args.shard_window if args.shard else None, facet_values, report)
+    else:
+        pages = (dict(page, query_index=i) for i, query in enumerate(queries)
+                 for page in crawl_sequential(fetcher, query, report=report))
+    pages = unique_courses(pages)
+    enrich = None
+    if args.enrich:
+        enrich_fields = [field.strip() for field in args.enrich_fields.split(",") if field.strip()]
+        fields += [field for field in enrich_fields if field not in fields]
+        fetch_detail = make_detail_fetcher(make_detail_json_getter(fetcher), args.detail_url)
+
+        def enrich(pages):
+            return enrich_pages(pages, fetch_detail, args.detail_workers, enrich_fields)
+    if args.incremental:
+        store = CourseStore(args.store)
+        with open_exporter(args.delta, ['op'] + fields, args.format) as delta:
+            # Only new/changed courses are enriched; their hashes are of the list records
+            counts = sync_pages(pages, store, delta, report, enrich)
+        print(f"Delta written to {args.delta}: {counts} ({store.count_active()} courses indexed)")
+        store.close()
+    else:
+        if enrich is not None:
+            pages = enrich(pages)
+        with open_exporter(args.output, fields, args.format) as exporter:
+            count = export_pages(pages, exporter)
+        print(f"Exported {count} courses to {args.output}")
+    print(f"Requests: {fetcher.metrics.summary()}")
+    fetcher.close()
+    if http_cache is not None:
+        print(f"HTTP cache: {http_cache.hits} hits, {http_cache.misses} misses")
+        http_cache.close()
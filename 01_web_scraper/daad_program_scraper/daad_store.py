@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+DAAD Course Index
+
+Description:
+    Local SQLite store keyed by course id, holding a content hash of each course's
+    full Solr record (not the exported --fields projection, so changing the export
+    fields does not report every course as changed). It lets a run upsert only new
+    or changed courses and tombstone the ones that disappeared, so downstream
+    consumers can process deltas instead of re-diffing full snapshots.
+"""
+
+import sqlite3
+import hashlib
+import json
+import time
+
+
+def record_hash(record):
+    """Stable content hash of a record (key order independent)."""
+    return hashlib.sha1(json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class CourseStore(object):
+    def __init__(self, path="daad_index.sqlite3"):
+        self.path = path
+        self.run_ts = None
+        self.__conn = sqlite3.connect(path)
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS courses ("
+            " id TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " record TEXT NOT NULL,"
+            " first_seen INTEGER NOT NULL,"
+            " last_seen INTEGER NOT NULL,"
+            " deleted_at INTEGER)"
+        )
+        self.__conn.commit()
+
+    def begin_run(self):
+        # Runs are identified by their start time (kept strictly increasing); last_seen marks membership in a run
+        last = self.__conn.execute("SELECT MAX(last_seen) FROM courses").fetchone()[0] or 0
+        self.run_ts = max(int(time.time()), last + 1)
+        return self.run_ts
+
+    def upsert(self, record):
+        """
+        Stores a full course record seen in the current run; it must have an `id`.
+        Returns 'new', 'changed', or None if it is unchanged.
+        """
+        course_id = str(record['id'])
+        digest = record_hash(record)
+        row = self.__conn.execute("SELECT hash, deleted_at FROM courses WHERE id = ?", (course_id,)).fetchone()
+        if row is not None and row[0] == digest and row[1] is None:
+            self.__conn.execute("UPDATE courses SET last_seen = ? WHERE id = ?", (self.run_ts, course_id))
+            return None
+        self.__conn.execute(
+            "INSERT INTO courses (id, hash, record, first_seen, last_seen, deleted_at) VALUES (?, ?, ?, ?, ?, NULL)"
+            " ON CONFLICT(id) DO UPDATE SET hash = excluded.hash, record = excluded.record,"
+            " last_seen = excluded.last_seen, deleted_at = NULL",
+            (course_id, digest, json.dumps(record, ensure_ascii=False), self.run_ts, self.run_ts)
+        )
+        # A course that was tombstoned and came back is reported as new
+        return 'new' if row is None or row[1] is not None else 'changed'
+
+    def tombstone_missing(self):
+        """
+        Marks live courses not seen in the current run as deleted. Returns their ids.
+        Only call this after a crawl verified as complete.
+        """
+        ids = [row[0] for row in self.__conn.execute(
+            "SELECT id FROM courses WHERE deleted_at IS NULL AND last_seen < ?", (self.run_ts,))]
+        self.__conn.execute(
+            "UPDATE courses SET deleted_at = ? WHERE deleted_at IS NULL AND last_seen < ?", (self.run_ts, self.run_ts))
+        return ids
+
+    def count_active(self):
+        return self.__conn.execute("SELECT COUNT(*) FROM courses WHERE deleted_at IS NULL").fetchone()[0]
+
+    def commit(self):
+        self.__conn.commit()
+
+    def rollback(self):
+        self.__conn.rollback()
+
+    def close(self):
+        self.__conn.close()
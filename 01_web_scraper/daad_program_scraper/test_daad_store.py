@@ -0,0 +1,105 @@
+import pytest
+
+import daad_program_scraper as daad
+from daad_store import CourseStore, record_hash
+
+
+class Delta(object):
+    """In-memory stand-in for a delta exporter."""
+    def __init__(self, fields=('op', 'id', 'courseName')):
+        self.fields = list(fields)
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append(record)
+
+    def flush(self):
+        pass
+
+
+def course(course_id, name="Computer Science", **extra):
+    return dict({'id': course_id, 'courseName': name, 'academy': "TU"}, **extra)
+
+
+def sync(store, courses, complete=True):
+    report = daad.CrawlReport()
+    if not complete:
+        report.skip("http://example.com/page", "HTTP 503")
+    delta = Delta()
+    counts = daad.sync_pages([{'courses': courses}], store, delta, report)
+    return counts, delta.rows
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CourseStore(str(tmp_path / 'index.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_record_hash_ignores_key_order():
+    assert record_hash({'id': 1, 'a': [1, 2], 'b': "x"}) == record_hash({'b': "x", 'a': [1, 2], 'id': 1})
+    assert record_hash({'id': 1, 'a': [1, 2]}) != record_hash({'id': 1, 'a': [2, 1]})
+
+
+def test_sync_reports_new_changed_and_unchanged(store):
+    counts, rows = sync(store, [course(1), course(2)])
+    assert (counts['new'], counts['changed']) == (2, 0)
+    assert [row['op'] for row in rows] == ['new', 'new']
+
+    counts, rows = sync(store, [course(1), course(2, academy="LMU")])
+    assert (counts['unchanged'], counts['changed']) == (1, 1)
+    assert rows == [{'op': 'changed', 'id': 2, 'courseName': "Computer Science"}]
+
+
+def test_field_outside_export_still_counts_as_change(store):
+    sync(store, [course(1)])
+    counts, _ = sync(store, [course(1, tuitionFees="1500 EUR")])
+    assert counts['changed'] == 1
+
+
+def test_complete_run_tombstones_missing_courses(store):
+    sync(store, [course(1), course(2)])
+    counts, rows = sync(store, [course(1)])
+    assert counts['deleted'] == 1
+    assert rows == [{'op': 'deleted', 'id': '2'}]
+    assert store.count_active() == 1
+
+    # A tombstoned course that comes back is new again
+    counts, _ = sync(store, [course(1), course(2)])
+    assert counts['new'] == 1
+
+
+def test_incomplete_run_keeps_missing_courses(store):
+    sync(store, [course(1), course(2)])
+    counts, rows = sync(store, [course(1)], complete=False)
+    assert counts['deleted'] == 0
+    assert rows == []
+    assert store.count_active() == 2
+
+
+def test_empty_run_keeps_all_courses(store):
+    sync(store, [course(1), course(2)])
+    counts, _ = sync(store, [])
+    assert counts['deleted'] == 0
+    assert store.count_active() == 2
+
+
+def test_courses_without_id_are_skipped(store):
+    counts, rows = sync(store, [course(1), {'courseName': "No id"}])
+    assert (counts['new'], counts['no_id']) == (1, 1)
+    assert len(rows) == 1
+
+
+def test_failed_run_rolls_back(store):
+    sync(store, [course(1)])
+
+    def pages():
+        yield {'courses': [course(1, academy="LMU"), course(2)]}
+        raise IOError("connection lost")
+
+    with pytest.raises(IOError):
+        daad.sync_pages(pages(), store, Delta(), daad.CrawlReport())
+    assert store.count_active() == 1
+    counts, _ = sync(store, [course(1)])
+    assert counts['unchanged'] == 1
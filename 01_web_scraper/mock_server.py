@@ -0,0 +1,267 @@
+"""
+Local Mock Server for the Scrapers
+
+Description:
+    Network-free stand-in for the sites the scrapers talk to, for benchmarks and
+    reproducible runs:
+
+    - DAAD Solr API: search.json (limit/offset paging, numResults, degree[] /
+      lang[] / bgn[] / modStd[] filters) and detail.json?id=
+    - KMF TOEFL: reading and listening list pages, detail pages, and audio files
+      (with Range support)
+
+    Synthetic data is generated deterministically from a seed. With --replay,
+    responses recorded in a shared HTTP cache directory (e.g. ../.http_cache
+    after a real --cache run) are served for the URLs they were recorded for,
+    whatever the host.
+
+    Latency (uniform around --latency) and an error rate (503 responses) can be
+    injected to exercise retries.
+
+Usage:
+    python mock_server.py --port 8000 --latency 0.05 --error-rate 0.02
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(script_dir, '..')))
+from common.http_cache import normalize_url
+
+SOLR_PATH = "/deutschland/studienangebote/international-programmes/api/solr/en/"
+LIST_PAGES = 11
+
+
+class MockData(object):
+    """Deterministic synthetic DAAD courses and KMF pages."""
+    def __init__(self, courses=3000, articles_per_page=20, media_size=256 * 1024, seed=1):
+        self.articles_per_page = articles_per_page
+        self.media_size = media_size
+        rnd = random.Random(seed)
+        self.courses = []
+        for i in range(courses):
+            # Skewed towards the scraper's default search (degree 2, lang 2/4, modStd 7) so it returns most courses
+            self.courses.append({
+                'id': 100000 + i,
+                'courseName': "Computer Science {} <b>(M.Sc.)</b>".format(i),
+                'academy': "University {}\nCampus {}".format(i % 97, i % 5),
+                'applicationDeadline': "15 July {}".format(2020 + i % 6),
+                'degree': 2 if rnd.random() < 0.8 else rnd.choice([1, 3, 4, 5]),
+                'lang': rnd.choice([[2], [4], [2, 4], [1, 2], [3]]),
+                'bgn': rnd.choice([1, 2, 3]),
+                'modStd': 7 if rnd.random() < 0.8 else rnd.choice([1, 2, 3, 4, 5, 6]),
+            })
+        self.by_id = {course['id']: course for course in self.courses}
+
+    def search(self, params):
+        courses = self.courses
+        for facet in ('degree', 'lang', 'bgn', 'modStd'):
+            values = params.get(facet + '[]')
+            if values:
+                values = set(int(v) for v in values if v.isdigit())
+                courses = [c for c in courses if values & set(c[facet] if isinstance(c[facet], list) else [c[facet]])]
+        limit = int(params.get('limit', ['10'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        return {'courses': courses[offset:offset + limit], 'numResults': len(courses)}
+
+    def detail(self, course_id):
+        course = self.by_id.get(course_id)
+        if course is None:
+            return None
+        return {'course': dict(course, tuitionFees="{} EUR".format(course['id'] % 3 * 1500),
+                               languageRequirements="<p>IELTS 6.5\nTOEFL 90</p>",
+                               beginning="Winter semester", programmeDuration="4 semesters",
+                               description="<p>" + "Programme description. " * 80 + "</p>")}
+
+    def list_page(self, section, page):
+        links = ''.join(
+            '<li><a class="check-links js-check-link" href="/{0}/detail/{1}-{2}">TPO {1}-{2}</a>'
+            '<a class="other" href="/{0}/other">more</a></li>'.format(section, page, j)
+            for j in range(self.articles_per_page))
+        nav = '<p class="nav">navigation</p>' * 200
+        return '<html><head><title>List {}</title></head><body><div class="nav">{}</div><ul>{}</ul></body></html>'.format(
+            page, nav, links)
+
+    def read_page(self, article):
+        paragraphs = ''.join('<p>Paragraph {} of article {} &amp; more <b>bold</b> text.</p>\n'.format(k, article)
+                             for k in range(30))
+        return ('<html><head><title>Article {0}</title></head><body><div class="header">{1}</div>'
+                '<h1>Article {0}</h1><div id="js-stem-cont" class="stem">{2}</div>'
+                '<div class="footer">{3}</div></body></html>').format(
+            article, '<span>menu</span>' * 300, paragraphs, '<a href="#">link</a>' * 300)
+
+    def listen_page(self, article):
+        return ('<html><head><title>Listening {0}</title></head><body>'
+                '<audio src="/media/{0}.mp3"></audio>'
+                '<script>var player = {{"url": "\\/media\\/{0}-question.mp3"}};</script>'
+                '</body></html>').format(article)
+
+    def media(self, name):
+        block = hashlib.sha256(name.encode('utf-8')).digest()
+        return (block * (self.media_size // len(block) + 1))[:self.media_size]
+
+
+class Replay(object):
+    """Responses recorded by common.http_cache, looked up by path and query (any host)."""
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.entries = {}
+        conn = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'))
+        for url, status, headers, body_hash in conn.execute("SELECT url, status, headers, body_hash FROM entries"):
+            self.entries[self.key(url)] = (status, json.loads(headers), body_hash)
+        conn.close()
+
+    @staticmethod
+    def key(url):
+        parts = urlsplit(normalize_url(url))
+        return parts.path + ('?' + parts.query if parts.query else '')
+
+    def get(self, path):
+        entry = self.entries.get(self.key("http://replay" + path))
+        if entry is None:
+            return None
+        status, headers, body_hash = entry
+        with open(os.path.join(self.cache_dir, 'objects', body_hash[:2], body_hash), 'rb') as f:
+            content = f.read()
+        content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), 'application/octet-stream')
+        return status, content_type, content
+
+
+class MockServer(object):
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, data=None, replay_dir=None, seed=1):
+        self.data = data or MockData(seed=seed)
+        self.replay = Replay(replay_dir) if replay_dir else None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.__rnd = random.Random(seed)
+        self.__lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; with Nagle on, keep-alive requests stall ~40 ms on delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                server.handle(self, head=True)
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://{}:{}".format(host, self.httpd.server_port)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, handler, head=False):
+        with self.__lock:
+            self.requests += 1
+            fail = self.__rnd.random() < self.error_rate
+            delay = self.latency * self.__rnd.uniform(0.5, 1.5)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self.__lock:
+                self.errors += 1
+            return self.respond(handler, 503, 'text/plain', b'Service Unavailable', head=head)
+        response = self.route(handler.path, handler.headers.get('Range'))
+        if response is None:
+            return self.respond(handler, 404, 'text/plain', b'Not Found', head=head)
+        self.respond(handler, *response, head=head)
+
+    def route(self, path, range_header=None):
+        """Returns (status, content type, body[, extra headers]) or None."""
+        if self.replay is not None:
+            recorded = self.replay.get(path)
+            if recorded is not None:
+                return recorded
+        parts = urlsplit(path)
+        params = parse_qs(parts.query, keep_blank_values=True)
+        if parts.path == SOLR_PATH + "search.json":
+            return 200, 'application/json', json.dumps(self.data.search(params)).encode('utf-8')
+        if parts.path == SOLR_PATH + "detail.json":
+            course_id = params.get('id', [''])[0]
+            detail = self.data.detail(int(course_id)) if course_id.isdigit() else None
+            return None if detail is None else (200, 'application/json', json.dumps(detail).encode('utf-8'))
+        m = re.match(r'^/(read|listen)/ets/new-order/(\d+)/0$', parts.path)
+        if m:
+            page = int(m.group(2))
+            return (200, 'text/html; charset=utf-8', self.data.list_page(m.group(1), page).encode('utf-8')) \
+                if 1 <= page <= LIST_PAGES else None
+        m = re.match(r'^/read/detail/([\d-]+)$', parts.path)
+        if m:
+            return 200, 'text/html; charset=utf-8', self.data.read_page(m.group(1)).encode('utf-8')
+        m = re.match(r'^/listen/detail/([\d-]+)$', parts.path)
+        if m:
+            return 200, 'text/html; charset=utf-8', self.data.listen_page(m.group(1)).encode('utf-8')
+        m = re.match(r'^/media/([\w-]+\.mp3)$', parts.path)
+        if m:
+            return self.media_response(self.data.media(m.group(1)), range_header)
+        return None
+
+    @staticmethod
+    def media_response(body, range_header):
+        m = re.match(r'^bytes=(\d+)-$', range_header or '')
+        if not m:
+            return 200, 'audio/mpeg', body
+        start = int(m.group(1))
+        if start >= len(body):
+            return 416, 'audio/mpeg', b'', {'Content-Range': 'bytes */{}'.format(len(body))}
+        return 206, 'audio/mpeg', body[start:], {
+            'Content-Range': 'bytes {}-{}/{}'.format(start, len(body) - 1, len(body))}
+
+    @staticmethod
+    def respond(handler, status, content_type, body, extra_headers=None, head=False):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        if not head:
+            handler.wfile.write(body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the DAAD Solr API and KMF TOEFL pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="Port (0 picks a free one)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--courses", type=int, default=3000, help="Synthetic DAAD courses")
+    parser.add_argument("--articles", type=int, default=20, help="Synthetic TOEFL articles per list page")
+    parser.add_argument("--media-size", type=int, default=256 * 1024, help="Size of each synthetic audio file")
+    parser.add_argument("--replay", help="HTTP cache directory whose recorded responses are served first")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = MockData(args.courses, args.articles, args.media_size, args.seed)
+    mock = MockServer(args.host, args.port, args.latency, args.error_rate, data, args.replay, args.seed)
+    print(f"Serving on {mock.url}", flush=True)
+    try:
+        mock.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{mock.requests} requests, {mock.errors} injected errors")
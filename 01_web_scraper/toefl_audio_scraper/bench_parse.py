@@ -0,0 +1,90 @@
+"""
+TOEFL Parser Benchmark
+
+Description:
+    Measures pages per second of the HTML parsing backends on saved pages,
+    against the original full-tree parse (html.parser + regex tag stripping).
+    Any directory of saved pages works, e.g. the shared HTTP cache after a
+    crawl with --cache:
+
+        python toefl_audio_scraper.py --cache
+        python bench_parse.py ../.http_cache/objects
+
+    Pages containing the content div are benchmarked with parse_content, the
+    others (list pages) with get_read_detail_url. Link lists are checked to be
+    identical across backends.
+"""
+import re
+import os
+import time
+import argparse
+import bs4
+
+# The scraper module changes into its own directory on import
+start_dir = os.getcwd()
+from toefl_audio_scraper import parse_content, get_read_detail_url, PARSERS, lxml
+
+
+def parse_content_full(html_content):
+    """Original implementation: full tree, element serialized back to HTML, tags stripped by regex."""
+    soup = bs4.BeautifulSoup(html_content, features="html.parser")
+    content = soup.find('div', attrs={"id":"js-stem-cont"})
+    return re.sub(r"<.*?>", "", str(content))
+
+
+def get_read_detail_url_full(html_content):
+    soup = bs4.BeautifulSoup(html_content, features="html.parser")
+    return [a.attrs["href"] for a in soup.find_all('a', attrs={"class": "check-links js-check-link"})]
+
+
+def load_pages(path):
+    detail_pages, list_pages = [], []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.endswith('.tmp'):
+                continue
+            with open(os.path.join(root, name), 'rb') as f:
+                content = f.read()
+            if b'js-stem-cont' in content:
+                detail_pages.append(content)
+            elif b'js-check-link' in content:
+                list_pages.append(content)
+    return detail_pages, list_pages
+
+
+def bench(fn, pages, repeat):
+    """Best pages/sec over `repeat` passes."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            fn(page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(pages) / best if best else float('inf')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark TOEFL HTML parsing backends")
+    parser.add_argument("pages_dir", help="Directory of saved pages (searched recursively)")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per backend; the best one is reported")
+    args = parser.parse_args()
+
+    detail_pages, list_pages = load_pages(os.path.join(start_dir, args.pages_dir))
+    print(f"{len(detail_pages)} detail pages, {len(list_pages)} list pages")
+    backends = [('full', parse_content_full, get_read_detail_url_full)]
+    for name in PARSERS:
+        if name == 'lxml' and lxml is None:
+            print("lxml is not installed, skipping it.")
+            continue
+        backends.append((name,
+                         lambda page, name=name: parse_content(page, name),
+                         lambda page, name=name: get_read_detail_url(page, name)))
+
+    expected_links = [get_read_detail_url_full(page) for page in list_pages]
+    for name, content_fn, links_fn in backends:
+        if [links_fn(page) for page in list_pages] != expected_links:
+            print(f"Warning: {name} extracts different article links than the full parse.")
+        detail_rate = bench(content_fn, detail_pages, args.repeat) if detail_pages else 0
+        list_rate = bench(links_fn, list_pages, args.repeat) if list_pages else 0
+        print(f"{name:>8}: {detail_rate:8.1f} detail pages/s, {list_rate:8.1f} list pages/s")
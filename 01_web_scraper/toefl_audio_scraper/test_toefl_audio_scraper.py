@@ -0,0 +1,24 @@
+import toefl_audio_scraper as toefl
+from toefl_store import ArticleStore
+
+
+def test_text_keeps_link_order_after_resume(tmp_path):
+    links = ['/read/detail/{}'.format(i) for i in range(5)]
+    store = ArticleStore(str(tmp_path / 'tpo_articles.jsonl'))
+    # First run stored 0, 2, 4; the rerun retried 1 and 3, which are stored last
+    for i in (0, 2, 4, 1, 3):
+        store.append({'url': toefl.root_url + links[i], 'title': str(i), 'text': 'text {}\n'.format(i)})
+    output = tmp_path / 'tpo.txt'
+    toefl.write_text(store, links, str(output))
+    store.close()
+    assert output.read_text(encoding='utf-8') == ''.join('text {}\n'.format(i) for i in range(5))
+
+
+def test_text_skips_links_not_stored(tmp_path):
+    links = ['/read/detail/a', '/read/detail/b']
+    store = ArticleStore(str(tmp_path / 'tpo_articles.jsonl'))
+    store.append({'url': toefl.root_url + links[1], 'title': 'b', 'text': 'b\n'})
+    output = tmp_path / 'tpo.txt'
+    toefl.write_text(store, links, str(output))
+    store.close()
+    assert output.read_text(encoding='utf-8') == 'b\n'
@@ -0,0 +1,77 @@
+from toefl_store import ArticleStore
+
+
+def article(i):
+    return {'url': 'https://toefl.kmf.com/read/detail/{}'.format(i), 'title': "TPO {}".format(i),
+            'text': "Paragraph of article {} – with non-ASCII text.\n".format(i)}
+
+
+def test_records_read_back_by_url(tmp_path):
+    path = str(tmp_path / 'articles.jsonl')
+    store = ArticleStore(path)
+    for i in range(3):
+        store.append(article(i))
+    assert store.get(article(1)['url']) == article(1)
+    store.close()
+
+    store = ArticleStore(path)
+    assert len(store) == 3
+    assert article(2)['url'] in store
+    assert store.urls() == [article(i)['url'] for i in range(3)]
+    assert store.get(article(0)['url']) == article(0)
+    assert store.get('https://toefl.kmf.com/read/detail/missing') is None
+    store.close()
+
+
+def test_torn_record_is_truncated_on_open(tmp_path):
+    path = str(tmp_path / 'articles.jsonl')
+    store = ArticleStore(path)
+    store.append(article(0))
+    store.close()
+    size = (tmp_path / 'articles.jsonl').stat().st_size
+    # Crash after writing part of a record, before its index line
+    with open(path, 'ab') as f:
+        f.write(b'{"url": "https://toefl.kmf.com/read/detail/1", "title"')
+
+    store = ArticleStore(path)
+    assert len(store) == 1
+    assert (tmp_path / 'articles.jsonl').stat().st_size == size
+    store.append(article(1))
+    assert store.get(article(1)['url']) == article(1)
+    store.close()
+
+
+def test_torn_index_line_is_dropped(tmp_path):
+    path = str(tmp_path / 'articles.jsonl')
+    store = ArticleStore(path)
+    store.append(article(0))
+    store.append(article(1))
+    store.close()
+    # Crash in the middle of the last index line: that record is not finished
+    index = tmp_path / 'articles.jsonl.idx'
+    index.write_bytes(index.read_bytes()[:-5])
+
+    store = ArticleStore(path)
+    assert store.urls() == [article(0)['url']]
+    store.append(article(1))
+    store.close()
+    store = ArticleStore(path)
+    assert store.urls() == [article(0)['url'], article(1)['url']]
+    assert store.get(article(1)['url']) == article(1)
+    store.close()
+
+
+def test_index_past_end_of_data_is_ignored(tmp_path):
+    path = str(tmp_path / 'articles.jsonl')
+    store = ArticleStore(path)
+    store.append(article(0))
+    store.append(article(1))
+    store.close()
+    # Data file lost its tail (e.g. not synced before a power cut) while the index survived
+    data = tmp_path / 'articles.jsonl'
+    data.write_bytes(data.read_bytes()[:-10])
+
+    store = ArticleStore(path)
+    assert store.urls() == [article(0)['url']]
+    assert store.get(article(0)['url']) == article(0)
+    store.close()
@@ -0,0 +1,171 @@
+"""
+TOEFL Audio Downloader
+
+Description:
+    Audio stage of the TOEFL scraper: finds listening media URLs in detail pages
+    and downloads them concurrently.
+
+    - Files are streamed to disk in chunks (never held in memory) as <name>.part
+      and renamed once complete.
+    - An interrupted .part file is resumed with an HTTP Range request; servers
+      that ignore Range restart it from zero.
+    - Finished files are recorded in <out_dir>/manifest.json with their size and
+      sha256; a file whose size (and, with verify, checksum) matches is skipped
+      without any request. A file present on disk but missing from the manifest
+      is kept if its size matches the server's Content-Length (HEAD request).
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+from urllib.parse import urljoin, urlsplit, unquote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('mp3', 'm4a', 'aac', 'wav', 'ogg')
+# Quoted URLs ending in an audio extension: src/href/data-* attributes as well as inline player scripts
+media_pattern = re.compile(
+    rb"""["']([^"'\s<>]+?\.(?:""" + "|".join(AUDIO_EXTENSIONS).encode() + rb""")(?:\?[^"'\s<>]*)?)["']""", re.I)
+CHUNK_SIZE = 64 * 1024
+
+
+def extract_media_urls(html_content, page_url):
+    """Absolute audio URLs in a page, in document order, without duplicates."""
+    urls = []
+    for match in media_pattern.finditer(html_content):
+        url = urljoin(page_url, match.group(1).decode('utf-8', errors='replace').replace('\\/', '/'))
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def download_file(fetcher, url, path, chunk_size=CHUNK_SIZE):
+    """
+    Streams `url` to `path`, resuming from `path`.part if present.
+    Returns (size, sha256, downloaded) of the completed file; `downloaded` is
+    False when an existing file already matched the remote size.
+    """
+    part_path = path + ".part"
+    # Byte ranges and sizes refer to the file itself, not a compressed transfer
+    headers = {'Accept-Encoding': 'identity'}
+    if os.path.exists(path) and not os.path.exists(part_path):
+        head = fetcher.head(url, headers=headers)
+        length = head.headers.get('Content-Length', '')
+        if head.ok and length.isdigit() and int(length) == os.path.getsize(path):
+            return int(length), file_digest(path), False
+    sha = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+
+    if offset:
+        headers['Range'] = "bytes={}-".format(offset)
+    with fetcher.get(url, headers=headers, stream=True) as r:
+        if r.status_code == 416:
+            # The part file already holds the whole body
+            total = r.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit() and int(total) == offset:
+                os.replace(part_path, path)
+                return offset, sha.hexdigest(), True
+            # Stale part file (the remote file changed); start over on the next attempt
+            os.remove(part_path)
+        r.raise_for_status()
+        if offset and r.status_code != 206:
+            print(f"Server ignored the range request for {url}, restarting it.")
+            offset = 0
+            sha = hashlib.sha256()
+        expected = r.headers.get('Content-Length')
+        expected = offset + int(expected) if expected and expected.isdigit() else None
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in r.iter_content(chunk_size):
+                f.write(chunk)
+                sha.update(chunk)
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        raise IOError("Incomplete download of {}: {} of {} bytes".format(url, size, expected))
+    os.replace(part_path, path)
+    return size, sha.hexdigest(), True
+
+
+class AudioDownloader(object):
+    def __init__(self, out_dir, fetcher, workers=4, verify=False):
+        self.out_dir = out_dir
+        self.fetcher = fetcher
+        self.workers = workers
+        self.verify = verify
+        self.manifest_path = os.path.join(out_dir, "manifest.json")
+        self.__lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def file_name(self, url, used):
+        name = unquote(os.path.basename(urlsplit(url).path)) or hashlib.sha1(url.encode('utf-8')).hexdigest()
+        if used.get(name, url) != url:
+            # Same file name under another URL
+            name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8] + "_" + name
+        used[name] = url
+        return name
+
+    def is_complete(self, url, path):
+        entry = self.manifest.get(url)
+        if entry is None or not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+            return False
+        return not self.verify or file_digest(path) == entry['sha256']
+
+    def download_all(self, urls):
+        """Downloads every URL not already complete. Returns (downloaded, skipped, failed) counts."""
+        used = {entry['file']: url for url, entry in self.manifest.items()}
+        jobs = []
+        skipped = 0
+        for url in urls:
+            name = self.manifest[url]['file'] if url in self.manifest else self.file_name(url, used)
+            path = os.path.join(self.out_dir, name)
+            if self.is_complete(url, path):
+                skipped += 1
+                continue
+            if url in self.manifest and os.path.exists(path):
+                # Recorded file no longer matches its size/checksum
+                os.remove(path)
+            jobs.append((url, name, path))
+
+        downloaded = failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(download_file, self.fetcher, url, path): (url, name)
+                       for url, name, path in jobs}
+            for future in as_completed(futures):
+                url, name = futures[future]
+                try:
+                    size, digest, fetched = future.result()
+                except Exception as e:
+                    print(f"Failed to download {url}: {e}")
+                    failed += 1
+                    continue
+                if fetched:
+                    downloaded += 1
+                    print(f"Downloaded {name} ({size} bytes)")
+                else:
+                    skipped += 1
+                self.record(url, {'file': name, 'size': size, 'sha256': digest})
+        return downloaded, skipped, failed
+
+    def record(self, url, entry):
+        with self.__lock:
+            self.manifest[url] = entry
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,91 @@
+"""
+TOEFL Article Store
+
+Description:
+    Append-only store of crawled articles, one JSON record per line
+    ({"url", "title", "text"}), with an offset index next to it
+    (<path>.idx, one "offset<TAB>length<TAB>url" line per article).
+
+    The index is written after each record has been flushed, so it doubles as
+    the crawl checkpoint: URLs in the index are finished, and a record left
+    without an index line by a crash is truncated away on the next open.
+    Records are read back by URL through a memory-mapped view of the data
+    file, without scanning it.
+"""
+import os
+import json
+import mmap
+
+
+class ArticleStore(object):
+    def __init__(self, path="tpo_articles.jsonl"):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.__offsets = {}
+        self.__mmap = None
+        self.__end = self.__load_index()
+        # Drop anything written after the last indexed record
+        with open(self.path, 'ab') as f:
+            f.truncate(self.__end)
+        self.__data = open(self.path, 'ab')
+        self.__index = open(self.index_path, 'ab')
+
+    def __load_index(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        end = 0
+        valid_bytes = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset, length, url = line.decode('utf-8').rstrip('\n').split('\t', 2)
+                    offset, length = int(offset), int(length)
+                    if offset + length > size:
+                        break
+                    self.__offsets[url] = (offset, length)
+                    end = max(end, offset + length)
+                    valid_bytes += len(line)
+            # Drop a partially written index line
+            with open(self.index_path, 'ab') as f:
+                f.truncate(valid_bytes)
+        return end
+
+    def __contains__(self, url):
+        return url in self.__offsets
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def urls(self):
+        """Stored URLs in the order they were written."""
+        return sorted(self.__offsets, key=lambda url: self.__offsets[url][0])
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        offset = self.__end
+        self.__data.write(line)
+        self.__data.flush()
+        self.__index.write("{}\t{}\t{}\n".format(offset, len(line), record['url']).encode('utf-8'))
+        self.__index.flush()
+        self.__offsets[record['url']] = (offset, len(line))
+        self.__end += len(line)
+
+    def get(self, url):
+        """Returns the stored record for `url`, or None."""
+        if url not in self.__offsets:
+            return None
+        offset, length = self.__offsets[url]
+        if self.__mmap is None or len(self.__mmap) < offset + length:
+            # (Re)map after appends grew the file past the current view
+            if self.__mmap is not None:
+                self.__mmap.close()
+            with open(self.path, 'rb') as f:
+                self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return json.loads(self.__mmap[offset:offset + length])
+
+    def close(self):
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__data.close()
+        self.__index.close()
@@ -0,0 +1,212 @@
+"""
+Alert Dispatcher
+
+Description:
+    Sends the monitor's email alerts from a background thread, so a slow or
+    unreachable mail server never delays polling.
+
+    - Alerts are queued by `submit()`, which never blocks
+    - One authenticated SMTP connection (STARTTLS + login, unless disabled for
+      a local relay) is reused across emails, reconnected when the server
+      dropped it, and closed after it has been idle for a while
+    - Alerts arriving within `digest_window` seconds of each other are sent as
+      one digest email instead of one email per target
+    - An alert identical (target and reasons) to one still queued or in the
+      batch being sent is dropped. The monitor only alerts when a rule starts
+      firing, so later repeats are real re-fires and are sent; `dedup_window`
+      (off by default) also drops repeats within that many seconds of a
+      delivered alert
+    - A failed send is retried with a fresh connection and backoff; after the
+      last attempt the batch is dropped and logged
+    - An optional `on_result(alert, delivered)` callback is told the outcome
+      of every alert (e.g. for delivery metrics)
+"""
+import time
+import queue
+import smtplib
+import threading
+from email.mime.text import MIMEText
+
+DEFAULT_DIGEST_WINDOW = 10.0
+DEFAULT_DEDUP_WINDOW = 0.0
+# Close the SMTP connection after this long without alerts (servers drop idle ones anyway)
+IDLE_TIMEOUT = 120.0
+MAX_BATCH = 100
+SEND_ATTEMPTS = 3
+
+
+class Alert(object):
+    def __init__(self, name, url, reasons, details=None):
+        self.name = name
+        self.url = url
+        self.reasons = list(reasons)
+        # e.g. a diff of the watched text; not part of the dedup key
+        self.details = details
+        self.created = time.time()
+
+    def key(self):
+        return self.name, tuple(self.reasons)
+
+
+class AlertDispatcher(object):
+    def __init__(self, settings, digest_window=DEFAULT_DIGEST_WINDOW, dedup_window=DEFAULT_DEDUP_WINDOW,
+                 idle_timeout=IDLE_TIMEOUT, max_batch=MAX_BATCH, on_result=None):
+        self.settings = settings
+        self.on_result = on_result
+        self.digest_window = digest_window
+        self.dedup_window = dedup_window
+        self.idle_timeout = idle_timeout
+        self.max_batch = max_batch
+        self.sent = 0
+        self.dropped = 0
+        self.__queue = queue.Queue()
+        self.__smtp = None
+        # Keys of alerts queued or being sent, and delivery times by key (for dedup_window)
+        self.__pending = set()
+        self.__last_sent = {}
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, name="alert-dispatcher", daemon=True)
+        self.__thread.start()
+
+    def submit(self, name, url, reasons, details=None):
+        """
+        Queues an alert; returns False if the same alert is still pending or was
+        delivered within the dedup window.
+        """
+        alert = Alert(name, url, reasons, details)
+        with self.__lock:
+            if alert.key() in self.__pending:
+                return False
+            last = self.__last_sent.get(alert.key())
+            if last is not None and alert.created - last < self.dedup_window:
+                return False
+            self.__pending.add(alert.key())
+        self.__queue.put(alert)
+        return True
+
+    def close(self, timeout=30):
+        """Sends what is queued, then closes the SMTP connection."""
+        self.__queue.put(None)
+        self.__thread.join(timeout)
+
+    def __run(self):
+        while True:
+            try:
+                alert = self.__queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self.__disconnect()
+                continue
+            if alert is None:
+                break
+            batch = [alert]
+            stop = self.__collect(batch)
+            try:
+                self.__send_batch(batch)
+            except Exception as e:
+                # e.g. a bad email template; keep the thread alive for later alerts
+                print(f"Failed to send {len(batch)} alert(s): {e}")
+                self.__report(batch, False)
+            if stop:
+                break
+        self.__disconnect()
+
+    def __collect(self, batch):
+        """Adds alerts arriving within the digest window to `batch`; returns True on close()."""
+        deadline = time.monotonic() + self.digest_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                alert = self.__queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if alert is None:
+                return True
+            batch.append(alert)
+        return False
+
+    def __send_batch(self, batch):
+        subject, body = self.format(batch)
+        for attempt in range(SEND_ATTEMPTS):
+            try:
+                self.__send(subject, body)
+                latency = time.time() - batch[0].created
+                print(f"Alert email sent successfully ({len(batch)} alert(s), {latency:.1f}s after detection).")
+                self.__report(batch, True)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Failed to send email (attempt {attempt + 1}/{SEND_ATTEMPTS}): {e}")
+                self.__disconnect()
+                if attempt + 1 < SEND_ATTEMPTS:
+                    time.sleep(2 ** attempt * 5)
+        self.__report(batch, False)
+
+    def __report(self, batch, delivered):
+        now = time.time()
+        with self.__lock:
+            for alert in batch:
+                self.__pending.discard(alert.key())
+                # Only a delivered alert holds back repeats; a dropped one may be submitted again
+                if delivered:
+                    self.__last_sent[alert.key()] = now
+        if delivered:
+            self.sent += len(batch)
+        else:
+            self.dropped += len(batch)
+        if self.on_result is not None:
+            for alert in batch:
+                self.on_result(alert, delivered)
+
+    def format(self, batch):
+        """Subject and body of one email for the batch: the single alert, or a digest."""
+        blocks = []
+        for alert in batch:
+            block = self.settings['title'].format(URL=alert.url, NAME=alert.name)
+            if alert.reasons:
+                block += "\n\n" + "\n".join("- " + reason for reason in alert.reasons)
+            if alert.details:
+                block += "\n\nChanges:\n" + alert.details
+            blocks.append(block)
+        if len(batch) == 1:
+            return self.settings['subject'], blocks[0]
+        subject = "{} ({} targets)".format(self.settings['subject'], len(batch))
+        body = "\n\n".join("[{}] {}".format(alert.name, block) for alert, block in zip(batch, blocks))
+        return subject, body
+
+    def __send(self, subject, body):
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = self.settings['smtp_user']
+        msg['To'] = self.settings['receiver']
+        if self.__smtp is None:
+            self.__connect()
+        else:
+            try:
+                self.__smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                # Dropped by the server since the last email
+                self.__disconnect()
+                self.__connect()
+        self.__smtp.sendmail(self.settings['smtp_user'], [self.settings['receiver']], msg.as_string())
+
+    def __connect(self):
+        smtp = smtplib.SMTP(self.settings['smtp_server'], self.settings['smtp_port'], timeout=30)
+        try:
+            if self.settings.get('smtp_starttls', True):
+                smtp.starttls()
+            if self.settings.get('smtp_password'):
+                smtp.login(self.settings['smtp_user'], self.settings['smtp_password'])
+        except Exception:
+            smtp.close()
+            raise
+        self.__smtp = smtp
+
+    def __disconnect(self):
+        if self.__smtp is None:
+            return
+        try:
+            self.__smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.__smtp.close()
+        self.__smtp = None
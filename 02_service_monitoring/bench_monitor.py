@@ -0,0 +1,250 @@
+"""
+Monitor Harness and Load Test
+
+Description:
+    Runs dormitory_monitor.py unmodified, as its own process, against the local
+    scripted-change site and SMTP sink (mock_site.py), then checks and measures
+    what came out:
+
+    - Every page flips to "rooms available" at known times, so each flip
+      should produce exactly one alert; missed and duplicate alerts are counted
+    - Change-to-alert latency: from the flip on the site to the email arriving
+      at the sink (detection, digest window and SMTP included)
+    - Polls per second (requests seen by the site) and the share answered 304
+    - CPU use and peak memory of the monitor process (/proc, or psutil)
+
+    Scenarios:
+    - e2e: a handful of targets with fast flips; exits with status 1 if any
+      alert is missed or duplicated
+    - flipback: rooms appear, disappear and appear again every few seconds,
+      so every re-fire must be alerted again (same exit status as e2e)
+    - load: 1,000 targets, to see how far one monitor process scales
+
+Usage:
+    python bench_monitor.py --scenario e2e
+    python bench_monitor.py --scenario flipback
+    python bench_monitor.py --scenario load --targets 1000 --interval 10 --duration 180 -o load.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import signal
+import tempfile
+import argparse
+import subprocess
+
+import yaml
+
+from mock_site import ScriptedSite, SmtpSink, NO_ROOMS_TEXT
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    'e2e': {'targets': 5, 'interval': 2.0, 'change_every': 15.0, 'duration': 75.0, 'concurrency': 5},
+    'flipback': {'targets': 3, 'interval': 1.0, 'change_every': 6.0, 'duration': 75.0, 'concurrency': 3},
+    'load': {'targets': 1000, 'interval': 10.0, 'change_every': 120.0, 'duration': 180.0, 'concurrency': 50},
+}
+ALERT_TITLE = "ALERT {NAME} {URL}"
+alert_pattern = re.compile(r'ALERT (t\d+) ')
+
+
+def process_usage(pid):
+    """(cpu seconds, rss MiB, peak rss MiB) of a running process; None where unavailable."""
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            fields = f.read().rpartition(')')[2].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss = peak = None
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) / 1024
+        return cpu, rss, peak
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss / (1024 * 1024), None
+        except psutil.Error:
+            pass
+    return None, None, None
+
+
+def write_config(path, args, site, sink):
+    config = {
+        'targets': [{
+            'name': "t{}".format(i),
+            'url': site.page_url(i),
+            'rules': [{'literal': NO_ROOMS_TEXT, 'selector': '#offers', 'alert_when': 'absent'}],
+            'check_interval': args.interval,
+            'min_interval': args.interval / 2,
+            'max_interval': args.interval * 2,
+        } for i in range(args.targets)],
+        'monitor_config': {'max_concurrency': args.concurrency, 'host_rate': 0, 'history_limit': 10},
+        'receive_emailbox_config': {'emailbox': 'alerts@example.com'},
+        'send_emailbox_config': {'smtp_server': '127.0.0.1', 'smtp_port': sink.port, 'smtp_user': 'monitor@example.com',
+                                 'smtp_password': '', 'smtp_starttls': False},
+        'email_config': {'subject': 'ALERT', 'title': ALERT_TITLE, 'digest_window': args.digest_window},
+    }
+    # The monitor's default dedup unless set, so re-fires are checked against what users get
+    if args.dedup_window is not None:
+        config['email_config']['dedup_window'] = args.dedup_window
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+
+
+def alert_times(sink):
+    """{target name: [arrival times]} from the emails in the sink (digests name several targets)."""
+    arrivals = {}
+    for arrived, message in sink.messages:
+        body = message.get_payload(decode=True).decode('utf-8', errors='replace')
+        for name in alert_pattern.findall(body):
+            arrivals.setdefault(name, []).append(arrived)
+    return arrivals
+
+
+def evaluate_alerts(site, sink, stopped, settle):
+    """
+    Matches every rooms-available flip (old enough to have been seen by
+    `stopped - settle`) with the alerts that arrived before the page's next
+    flip to available. Returns (latencies, missed, duplicates, flips).
+    """
+    arrivals = alert_times(sink)
+    latencies = []
+    missed = duplicates = flips = 0
+    for page in range(site.pages):
+        times = arrivals.get("t{}".format(page), [])
+        for flip in site.available_since(page, stopped - settle):
+            flips += 1
+            window = [t for t in times if flip <= t < flip + 2 * site.change_every]
+            if not window:
+                missed += 1
+                continue
+            latencies.append(min(window) - flip)
+            duplicates += len(window) - 1
+    return latencies, missed, duplicates, flips
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(args):
+    site = ScriptedSite(args.targets, args.change_every, args.latency, args.page_size).start()
+    sink = SmtpSink().start()
+    work_dir = tempfile.mkdtemp(prefix="bench_monitor_")
+    config_file = os.path.join(work_dir, 'config.yaml')
+    write_config(config_file, args, site, sink)
+    log_path = os.path.join(work_dir, 'monitor.log')
+    print(f"{args.targets} targets at {site.url}, SMTP sink on port {sink.port}, work dir {work_dir}")
+
+    with open(log_path, 'w') as log:
+        monitor = subprocess.Popen(
+            [sys.executable, '-u', os.path.join(script_dir, 'dormitory_monitor.py'), '--config', config_file,
+             '--state-db', os.path.join(work_dir, 'state.sqlite3')],
+            stdout=log, stderr=subprocess.STDOUT)
+    started = time.time()
+    warmup_end = started + args.warmup
+    end = started + args.duration
+    peak_rss = 0.0
+    window_start = None
+    try:
+        while time.time() < end:
+            time.sleep(1)
+            if monitor.poll() is not None:
+                raise RuntimeError("Monitor exited early with status {}, see {}".format(monitor.returncode, log_path))
+            cpu, rss, peak = process_usage(monitor.pid)
+            peak_rss = max(peak_rss, peak or 0.0, rss or 0.0)
+            if window_start is None and time.time() >= warmup_end:
+                window_start = (time.time(), site.requests, site.not_modified, cpu)
+        window_end = (time.time(), site.requests, site.not_modified, process_usage(monitor.pid)[0])
+    finally:
+        stopped = time.time()
+        # SIGINT lets the monitor flush queued alerts and close its state database
+        monitor.send_signal(signal.SIGINT if os.name != 'nt' else signal.SIGTERM)
+        try:
+            monitor.wait(timeout=args.digest_window + 30)
+        except subprocess.TimeoutExpired:
+            monitor.kill()
+            monitor.wait()
+    # Alerts still on their way after the stop
+    time.sleep(1)
+    site.stop()
+    sink.stop()
+
+    elapsed = window_end[0] - window_start[0]
+    polls = window_end[1] - window_start[1]
+    cpu = None if window_end[3] is None or window_start[3] is None else window_end[3] - window_start[3]
+    settle = 2 * args.interval + args.digest_window + 5
+    latencies, missed, duplicates, flips = evaluate_alerts(site, sink, stopped, settle)
+    return {
+        'scenario': args.scenario, 'targets': args.targets, 'interval': args.interval,
+        'change_every': args.change_every, 'seconds': elapsed,
+        'polls_per_sec': polls / elapsed if elapsed else 0.0,
+        'not_modified_share': (window_end[2] - window_start[2]) / polls if polls else 0.0,
+        'cpu_percent': 100.0 * cpu / elapsed if cpu is not None and elapsed else None,
+        'peak_rss_mib': peak_rss or None,
+        'flips': flips, 'alerts_matched': len(latencies), 'missed': missed, 'duplicates': duplicates,
+        'emails': len(sink.messages),
+        'latency_p50': percentile(latencies, 0.5), 'latency_p95': percentile(latencies, 0.95),
+        'latency_max': max(latencies) if latencies else None,
+        'log': log_path,
+    }
+
+
+def print_result(result):
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+    print(f"Polls:    {result['polls_per_sec']:.1f}/s over {result['seconds']:.0f}s "
+          f"({result['not_modified_share'] * 100:.0f}% answered 304)")
+    print(f"Monitor:  CPU {fmt(result['cpu_percent'], '.1f')}%, peak RSS {fmt(result['peak_rss_mib'], '.1f')} MiB")
+    print(f"Alerts:   {result['alerts_matched']}/{result['flips']} flips alerted, {result['missed']} missed, "
+          f"{result['duplicates']} duplicates, {result['emails']} emails")
+    print(f"Latency:  p50 {fmt(result['latency_p50'], '.1f')}s, p95 {fmt(result['latency_p95'], '.1f')}s, "
+          f"max {fmt(result['latency_max'], '.1f')}s (page change to email received)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end harness and load test for dormitory_monitor")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default='e2e')
+    parser.add_argument("--targets", type=int, help="Simulated target pages")
+    parser.add_argument("--interval", type=float, help="check_interval of every target (seconds)")
+    parser.add_argument("--change-every", type=float, help="Seconds between state flips of a page")
+    parser.add_argument("--duration", type=float, help="Seconds to run the monitor")
+    parser.add_argument("--concurrency", type=int, help="monitor_config.max_concurrency")
+    parser.add_argument("--warmup", type=float, help="Seconds excluded from the rates (default: 1.5 intervals)")
+    parser.add_argument("--digest-window", type=float, default=2.0, help="email_config.digest_window")
+    parser.add_argument("--dedup-window", type=float, help="email_config.dedup_window (default: the monitor's)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay of the site in seconds")
+    parser.add_argument("--page-size", type=int, default=20 * 1024, help="Approximate page size in bytes")
+    parser.add_argument("-o", "--output", help="Write the result as JSON")
+    args = parser.parse_args()
+
+    for key, value in SCENARIOS[args.scenario].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    if args.warmup is None:
+        args.warmup = min(1.5 * args.interval + 10, args.duration / 2)
+
+    result = run(args)
+    print_result(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.scenario in ('e2e', 'flipback') and (result['missed'] or result['duplicates'] or not result['flips']):
+        print("FAILED: every flip should produce exactly one alert.")
+        sys.exit(1)
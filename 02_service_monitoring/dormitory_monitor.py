@@ -2,120 +2,370 @@
 Dormitory Availability Monitor
 
 Description:
-    A persistent service that monitors the student housing website for changes in text.
+    A persistent service that monitors student housing (and similar booking) websites for changes in text.
     It uses a YAML configuration file for easy deployment and management of credentials.
-    
+
     Features:
     - Configuration separation (config.yaml)
-    - Anti-bot random intervals
-    - SMTP Email alerts
+    - Multiple targets (`targets:` list), each with its own URL, rules and interval,
+      polled from one process on an asyncio scheduler; the legacy single
+      `web_config` section is still accepted
+    - Match rules compiled at config load (match_rules.py): literal or regex,
+      optionally scoped to a CSS selector, alerting when absent or present;
+      only the text the rules need is extracted, without a full page tree
+    - Alerts on every transition, monitoring keeps running afterwards
+    - Persistent history (snapshot_store.py, SQLite): per-target state is
+      restored at startup, so restarts neither repeat nor lose alerts;
+      changed extracts are stored compactly and their diff goes into alerts
+    - Cheap unchanged polls: conditional requests (If-None-Match /
+      If-Modified-Since from the last response's validators), and a body hash
+      that skips parsing when the page is byte-for-byte unchanged
+    - Adaptive polling (scheduler.py): intervals shrink for pages whose
+      watched text changes and during configured hot windows, stretch for
+      static pages, back off exponentially on errors and 429s, with random
+      jitter; a global request budget caps the total poll rate
+    - SMTP Email alerts sent by a background dispatcher (alert_dispatcher.py):
+      one reused SMTP connection, queued duplicates dropped, and a digest email for
+      changes detected close together
+    - Optional Prometheus metrics endpoint (metrics.py, --metrics-port):
+      per-target polls, errors, 304s, bytes, changes, alerts, and fetch /
+      parse / alert delivery latency histograms
+    - Shared Fetch Layer (common/fetch): pooled session and timeouts; failed
+      polls are not retried there, the scheduler backs off instead
 """
 
-import requests
-import random
-from bs4 import BeautifulSoup
-import smtplib
-from email.mime.text import MIMEText
 import time
+import random
+import hashlib
+import requests
+import argparse
+import asyncio
 import yaml
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-# Load configuration file path (assumes config.yaml is in the same directory)
+# --- Path Setup for the shared 'common' package ---
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from common.fetch import Fetcher, retry_after
+from match_rules import compile_rules
+from alert_dispatcher import AlertDispatcher, DEFAULT_DIGEST_WINDOW, DEFAULT_DEDUP_WINDOW
+from scheduler import AdaptiveSchedule, RequestBudget, baseline_budget
+from metrics import MonitorMetrics, MetricsServer
+from snapshot_store import SnapshotStore, diff_regions, DEFAULT_HISTORY_LIMIT
+
+# Default configuration file path (config.yaml in the same directory)
 config_path = os.path.join(os.path.dirname(__file__), 'config.yaml')
 
-# Load YAML Configuration
-try:
-    with open(config_path, 'r', encoding='utf-8') as f:
+# Pages fetched at the same time (threads of the asyncio executor, pooled connections)
+DEFAULT_MAX_CONCURRENCY = 10
+
+# SMTP and email content settings, set by load_config
+email_settings = None
+# Shared Fetcher (pooled session, no retries of its own), created in main
+fetcher = None
+# Background email sender, created in main
+dispatcher = None
+# Per-target counters and histograms, served on /metrics when enabled
+metrics = MonitorMetrics()
+# State and extract history (SnapshotStore), opened in main; None keeps it in memory only
+store = None
+
+
+class Target(object):
+    """A monitored page and its last observed state."""
+    def __init__(self, name, url, rules, check_interval, schedule=None, alert_on_change=False):
+        self.name = name
+        self.url = url
+        # Compiled match rules (match_rules.RuleSet)
+        self.rules = rules
+        # Also alert on any change of the text the rules look at, not only when a rule fires
+        self.alert_on_change = alert_on_change
+        self.check_interval = check_interval
+        # When to poll next, and the poll statistics it is based on
+        self.schedule = schedule or AdaptiveSchedule(check_interval)
+        # Indexes of the rules that fired at the last check (None before the first one)
+        self.fired = None
+        # Validators and body hash of the last parsed response
+        self.etag = None
+        self.last_modified = None
+        self.body_hash = None
+        # Hash of the text the rules looked at in the last parsed response
+        self.region_hash = None
+        # That text itself, when there is no store to read it back from
+        self.regions = None
+
+    def state(self):
+        """What SnapshotStore saves; rules are identified by description so edits to the config are safe."""
+        return {
+            'rules': self.rules.signature(),
+            'fired': [self.rules.rules[i].describe() for i in sorted(self.fired or ())],
+            'etag': self.etag, 'last_modified': self.last_modified,
+            'body_hash': self.body_hash, 'region_hash': self.region_hash,
+        }
+
+    def restore(self, state):
+        """Resumes from a saved state (see state())."""
+        descriptions = [rule.describe() for rule in self.rules.rules]
+        self.fired = {i for i, description in enumerate(descriptions) if description in state['fired']}
+        if state['rules'] == self.rules.signature():
+            # Validators and hashes only mean "nothing to re-check" for the same rules
+            self.etag = state['etag']
+            self.last_modified = state['last_modified']
+            self.body_hash = state['body_hash']
+            self.region_hash = state['region_hash']
+
+
+def target_rules(item):
+    """A target's `rules` list, or its legacy `target_text` as a literal that alerts when absent."""
+    if item.get('rules'):
+        return compile_rules(item['rules'])
+    return compile_rules([{'literal': item['target_text'], 'alert_when': 'absent'}])
+
+def target_schedule(item):
+    """Adaptive schedule from a target's check_interval and optional min/max_interval, hot_windows, hot_interval."""
+    return AdaptiveSchedule(item['check_interval'], item.get('min_interval'), item.get('max_interval'),
+                            item.get('hot_windows') or (), item.get('hot_interval'))
+
+def load_config(path):
+    """
+    Reads targets and email settings from the YAML config.
+    Returns (targets, email settings, monitor options).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
 
-    # --- Extract Variables from Config ---
-
-    # Web Configuration
-    URL = config['web_config']['url']
-    TARGET_TEXT = config['web_config']['target_text']
-    CHECK_INTERVAL = config['web_config']['check_interval']
-
-    # Receiver Configuration
-    EMAIL_RECEIVER = config['receive_emailbox_config']['emailbox']
-
-    # Sender (SMTP) Configuration
-    SMTP_SERVER = config['send_emailbox_config']['smtp_server']
-    SMTP_PORT = config['send_emailbox_config']['smtp_port']
-    SMTP_USER = config['send_emailbox_config']['smtp_user']
-    SMTP_PASSWORD = config['send_emailbox_config']['smtp_password']
-
-    # Email Content Configuration
-    EMAIL_SUBJECT = config['email_config']['subject']
-    EMAIL_TITLE_TEMPLATE = config['email_config']['title']
-
-    print("Configuration loaded successfully.")
-
-except FileNotFoundError:
-    print(f"Error: Configuration file not found at {config_path}")
-    sys.exit(1)
-except KeyError as e:
-    print(f"Error: Missing required field in config file: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"Unknown error while loading config: {e}")
-    sys.exit(1)
-
-def fetch_page(url):
-    """Fetches the HTML content of the target website."""
-    response = requests.get(url)
+    # --- Targets: a `targets` list, or the legacy single `web_config` section ---
+    targets = []
+    if config.get('targets'):
+        for item in config['targets']:
+            targets.append(Target(item.get('name', item['url']), item['url'], target_rules(item),
+                                  item['check_interval'], target_schedule(item), item.get('alert_on_change', False)))
+    else:
+        web = config['web_config']
+        targets.append(Target(web['url'], web['url'], target_rules(web), web['check_interval'],
+                              target_schedule(web), web.get('alert_on_change', False)))
+    # The name keys saved state, metrics and alert dedup, so two targets must not share one
+    seen = set()
+    for target in targets:
+        if target.name in seen:
+            raise ValueError("duplicate target name {!r} (targets without a name default to their url; "
+                             "give each a distinct name)".format(target.name))
+        seen.add(target.name)
+
+    settings = {
+        # Receiver Configuration
+        'receiver': config['receive_emailbox_config']['emailbox'],
+        # Sender (SMTP) Configuration
+        'smtp_server': config['send_emailbox_config']['smtp_server'],
+        'smtp_port': config['send_emailbox_config']['smtp_port'],
+        'smtp_user': config['send_emailbox_config']['smtp_user'],
+        'smtp_password': config['send_emailbox_config']['smtp_password'],
+        'smtp_starttls': config['send_emailbox_config'].get('smtp_starttls', True),
+        # Email Content Configuration
+        'subject': config['email_config']['subject'],
+        'title': config['email_config']['title'],
+        # Alerts within this many seconds go out as one digest; dedup_window (default 0) drops repeats of a delivered alert
+        'digest_window': config['email_config'].get('digest_window', DEFAULT_DIGEST_WINDOW),
+        'dedup_window': config['email_config'].get('dedup_window', DEFAULT_DEDUP_WINDOW),
+    }
+    options = config.get('monitor_config') or {}
+    return targets, settings, options
+
+def fetch_page(url, headers=None):
+    """Fetches the target website; returns the response (200, or 304 to a conditional request)."""
+    response = fetcher.get(url, headers)
     response.raise_for_status()
-    return response.text
+    return response
 
-def check_text_change(html, target_text):
+def fetch_if_changed(target):
     """
-    Checks if the target text exists in the HTML.
-    Returns True if the text is present (no rooms).
-    Returns False if the text is missing (possible availability).
+    Returns (response, body hash) of the target page, or None if it is unchanged
+    since the last parsed poll: a 304 to the stored validators, or an identical body.
     """
-    soup = BeautifulSoup(html, "html.parser")
-    # Normalize text to lower case for comparison to be safe
-    return target_text.lower() in soup.get_text().lower()
+    headers = {}
+    if target.etag:
+        headers['If-None-Match'] = target.etag
+    if target.last_modified:
+        headers['If-Modified-Since'] = target.last_modified
+    start = time.perf_counter()
+    response = fetch_page(target.url, headers)
+    metrics.observe('monitor_fetch_seconds', target.name, time.perf_counter() - start)
+    metrics.inc('monitor_response_bytes_total', target.name, len(response.content))
+    if response.status_code == 304:
+        metrics.inc('monitor_not_modified_total', target.name)
+        return None
+    body_hash = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+    if body_hash == target.body_hash:
+        metrics.inc('monitor_unchanged_body_total', target.name)
+        return None
+    return response, body_hash
 
-def send_email(subject, body):
-    """Sends an email notification via SMTP."""
-    msg = MIMEText(body)
-    msg['Subject'] = subject
-    msg['From'] = SMTP_USER
-    msg['To'] = EMAIL_RECEIVER
+def check_target(target):
+    """
+    Polls one target (blocking; runs in the executor).
+    Returns (changed, fired, diff): whether the text the rules look at changed
+    since the last parsed poll, the rules that have just fired, i.e. whose
+    alert condition holds now but did not at the last check (or that fire on
+    the first check), and a diff of the change ('' if none).
+    An unchanged page (304 or same body hash) is not parsed again.
+    """
+    page = fetch_if_changed(target)
+    if page is None:
+        return False, [], ''
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_USER, [EMAIL_RECEIVER], msg.as_string())
-        print("Alert email sent successfully.")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    response, body_hash = page
+    start = time.perf_counter()
+    regions = target.rules.extract(response.text)
+    region_hash = hashlib.blake2b(repr(sorted(regions.items(), key=str)).encode('utf-8'), digest_size=16).hexdigest()
+    # Markup-only changes (tokens, timestamps elsewhere on the page) do not count
+    changed = target.region_hash is not None and region_hash != target.region_hash
+    fired = target.rules.fired(regions)
+    metrics.observe('monitor_parse_seconds', target.name, time.perf_counter() - start)
+    diff = ''
+    if changed:
+        # Only read back when the hashes differ; unchanged extracts are never diffed
+        previous_regions = store.latest(target.name) if store is not None else target.regions
+        diff = diff_regions(previous_regions, regions) if previous_regions is not None else ''
+    previous = target.fired or set()
+    for i in sorted(previous - fired):
+        print(f"[{target.name}] Cleared: {target.rules.rules[i].describe()}")
+    target.fired = fired
+    # Only remembered once parsed, so a failed check is retried on the next poll
+    target.etag = response.headers.get('ETag')
+    target.last_modified = response.headers.get('Last-Modified')
+    target.body_hash = body_hash
+    target.region_hash = region_hash
+    if store is not None:
+        store.save(target.name, target.state(), regions, region_hash)
+    else:
+        target.regions = regions
+    return changed, [target.rules.rules[i] for i in sorted(fired - previous)], diff
+
+def error_retry_after(error):
+    """Retry-After seconds of a 429 response error, or None."""
+    if isinstance(error, requests.HTTPError) and error.response is not None \
+            and error.response.status_code == 429:
+        return retry_after(error.response) or 0.0
+    return None
 
-def monitor_website():
-    """Main loop to monitor website changes."""
-    print(f"Starting monitoring service for: {URL}")
+async def watch_target(target, semaphore, budget):
+    """Polling loop of one target; keeps running after alerts."""
+    loop = asyncio.get_running_loop()
+    schedule = target.schedule
+    # Spread the first polls of all targets out
+    wait_time = random.uniform(0, min(schedule.base_interval, 10))
     while True:
-        # Add random jitter to avoid being detected as a bot
-        wait_time = CHECK_INTERVAL + random.randint(1, 5)
-        time.sleep(wait_time)
-        
+        await asyncio.sleep(wait_time)
+        await budget.acquire()
+        metrics.inc('monitor_polls_total', target.name)
+
         try:
-            html = fetch_page(URL)
-            if not check_text_change(html, TARGET_TEXT):
-                print("Status Change Detected: Target text disappeared!")
-                send_email(
-                    subject=EMAIL_SUBJECT,
-                    body=EMAIL_TITLE_TEMPLATE.format(URL=URL)
-                )
-                break  # Stop monitoring after sending the alert
+            async with semaphore:
+                changed, fired, diff = await loop.run_in_executor(None, check_target, target)
+            schedule.record_success(changed)
+            wait_time = schedule.next_delay()
+            if changed:
+                metrics.inc('monitor_changes_total', target.name)
+                metrics.set('monitor_last_change_timestamp_seconds', target.name, time.time())
+            reasons = [rule.describe() for rule in fired]
+            if changed and target.alert_on_change and not fired:
+                reasons = ["watched text changed"]
+            if reasons:
+                print(f"[{target.name}] Status Change Detected:\n" + "\n".join("- " + r for r in reasons))
+                # Queued for the dispatcher thread; polling never waits for the mail server
+                if dispatcher.submit(target.name, target.url, reasons, diff):
+                    metrics.inc('monitor_alerts_total', target.name)
             else:
-                print(f"No change detected. Checking again in {wait_time}s...")
+                status = "Watched text changed" if changed else "No change detected"
+                print(f"[{target.name}] {status}. Checking again in {wait_time:.0f}s...")
         except Exception as e:
-            print(f"Runtime Error: {e}")
-            # Wait longer on error before retrying
-            time.sleep(CHECK_INTERVAL + random.randint(50, 100))
+            metrics.inc('monitor_errors_total', target.name)
+            # Exponential backoff (at least Retry-After on a 429) before retrying
+            schedule.record_error(error_retry_after(e))
+            wait_time = schedule.next_delay()
+            print(f"[{target.name}] Runtime Error: {e}. Retrying in {wait_time:.0f}s...")
+        metrics.set('monitor_last_poll_timestamp_seconds', target.name, time.time())
+        metrics.set('monitor_next_poll_delay_seconds', target.name, wait_time)
+
+def record_alert_result(alert, delivered):
+    """AlertDispatcher callback: delivery counters and latency."""
+    if delivered:
+        metrics.inc('monitor_alerts_delivered_total', alert.name)
+        metrics.observe('monitor_alert_delivery_seconds', alert.name, time.time() - alert.created)
+    else:
+        metrics.inc('monitor_alerts_dropped_total', alert.name)
+
+async def monitor_websites(targets, max_concurrency=DEFAULT_MAX_CONCURRENCY, request_budget=None):
+    """
+    Monitors all targets concurrently from one event loop, with at most
+    `request_budget` polls per minute (default: what fixed check_intervals would make).
+    """
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_concurrency))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    if request_budget is None:
+        request_budget = baseline_budget(target.check_interval for target in targets)
+    budget = RequestBudget(request_budget)
+    print(f"Starting monitoring service for {len(targets)} target(s), budget {request_budget:.1f} polls/min:")
+    for target in targets:
+        schedule = target.schedule
+        print(f"  - {target.name}: {target.url} (every {schedule.base_interval:.0f}s, "
+              f"adaptive {schedule.min_interval:.0f}-{schedule.max_interval:.0f}s)")
+    await asyncio.gather(*(watch_target(target, semaphore, budget) for target in targets))
 
 if __name__ == "__main__":
-    monitor_website()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Dormitory Availability Monitor")
+    parser.add_argument("--config", default=config_path, help="YAML configuration file")
+    parser.add_argument("--state-db",
+                        help="SQLite file of saved state and history (default: monitor_config.state_db, "
+                             "else monitor_state.sqlite3 next to the config)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on this port (default: monitor_config.metrics_port, off)")
+    args = parser.parse_args()
+
+    # Load YAML Configuration
+    try:
+        targets, email_settings, options = load_config(args.config)
+        print("Configuration loaded successfully.")
+    except FileNotFoundError:
+        print(f"Error: Configuration file not found at {args.config}")
+        sys.exit(1)
+    except KeyError as e:
+        print(f"Error: Missing required field in config file: {e}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: Invalid value in config file: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Unknown error while loading config: {e}")
+        sys.exit(1)
+
+    max_concurrency = options.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+    state_db = args.state_db or options.get('state_db') or os.path.join(
+        os.path.dirname(os.path.abspath(args.config)), 'monitor_state.sqlite3')
+    store = SnapshotStore(state_db, options.get('history_limit', DEFAULT_HISTORY_LIMIT))
+    restored = 0
+    for target in targets:
+        state = store.load_state(target.name)
+        if state is not None:
+            target.restore(state)
+            restored += 1
+    print(f"State database: {state_db} ({restored} target(s) restored)")
+    # One pooled session for every check. No retries here: every request is a poll charged to the
+    # request budget, and a 429 or error goes straight to the target's schedule (Retry-After, backoff).
+    # Requests to one host are spaced to host_rate per second (raise it for many pages on one site)
+    fetcher = Fetcher(pool_size=max_concurrency, rate=options.get('host_rate', 1.0), retries=0)
+    dispatcher = AlertDispatcher(email_settings, email_settings['digest_window'], email_settings['dedup_window'],
+                                 on_result=record_alert_result)
+    metrics_port = args.metrics_port if args.metrics_port is not None else options.get('metrics_port')
+    if metrics_port is not None:
+        metrics_server = MetricsServer(metrics, options.get('metrics_host', '127.0.0.1'), metrics_port).start()
+        print(f"Metrics available at {metrics_server.url}")
+    try:
+        asyncio.run(monitor_websites(targets, max_concurrency, options.get('request_budget')))
+    except KeyboardInterrupt:
+        print("Monitoring stopped.")
+    finally:
+        # Sends alerts still queued
+        dispatcher.close()
+        store.close()
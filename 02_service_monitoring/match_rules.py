@@ -0,0 +1,249 @@
+"""
+Match Rules
+
+Description:
+    What the monitor looks for on a page. Rules are compiled once when the
+    config is loaded, and each poll only extracts the text the rules need:
+
+    - literal: a phrase, matched case-insensitively (case_sensitive: true to
+      opt out) with any run of whitespace in the page matching a space
+    - regex: a regular expression, searched in the same normalized text
+    - selector (optional): a CSS selector scoping the rule to the text of the
+      matching elements instead of the whole page
+    - alert_when: `absent` (default; e.g. a "no rooms available" notice) or
+      `present` (e.g. "rooms available")
+
+    Text extraction per scope:
+    - Whole page: a streaming scan that strips tags, scripts and comments with
+      regexes, without building a tree
+    - Selectors made of tag, #id and .class parts (div#main.box, div.notice > p):
+      translated to XPath and evaluated on one lxml parse of the page shared by
+      all rules; without lxml, a single compound such as div#main.box is a
+      SoupStrainer parse that only builds the matching elements
+    - Other selectors: lxml with cssselect when installed, else a full
+      BeautifulSoup tree (built by lxml when installed) queried with soupsieve
+
+    A selector that matches nothing yields empty text, so an `absent` rule
+    fires when the element it watched is gone.
+"""
+import re
+import hashlib
+from html import unescape
+
+import bs4
+import soupsieve
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    CSSSelector = None
+
+ALERT_WHEN = ('absent', 'present')
+# Tree builder of BeautifulSoup fallbacks
+soup_features = "lxml" if lxml is not None else "html.parser"
+
+# Whole-page scan: drop non-text blocks, then every tag
+skip_pattern = re.compile(r'<(script|style|template|noscript)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+tag_pattern = re.compile(r'<[^>]*>')
+# lxml refuses str input that declares an encoding (XHTML pages often do); the text is already decoded
+xml_declaration_pattern = re.compile(r'^\ufeff?\s*<\?xml[^>]*\?>')
+# tag, #id and .class parts of a simple selector
+simple_selector_pattern = re.compile(r'^([a-zA-Z][\w-]*)?((?:#[\w-]+)?)((?:\.[\w-]+)*)$')
+
+
+def normalize_text(text):
+    """Collapses whitespace runs to single spaces."""
+    return ' '.join(text.split())
+
+
+def page_text(html_content):
+    """Visible text of a whole page, without building a tree."""
+    return normalize_text(unescape(tag_pattern.sub(' ', skip_pattern.sub(' ', html_content))))
+
+
+def compound_xpath(compound):
+    """XPath step of a simple compound selector (tag, #id, .class), or None."""
+    m = simple_selector_pattern.match(compound)
+    if not m or not any(m.groups()):
+        return None
+    tag, element_id, classes = m.groups()
+    # ids and classes are restricted to [\w-], so they need no quoting
+    return (tag or '*') + ('[@id="{}"]'.format(element_id[1:]) if element_id else '') + ''.join(
+        '[contains(concat(" ", normalize-space(@class), " "), " {} ")]'.format(c)
+        for c in classes.split('.') if c)
+
+
+def selector_xpath(selector):
+    """
+    XPath of a selector made of simple compounds joined by descendant or child
+    combinators (e.g. `div.notice > p`), or None for anything else.
+    """
+    path = ''
+    axis = '//'
+    for step in re.split(r'\s*(>)\s*|\s+', selector.strip()):
+        if step is None:
+            continue
+        if step == '>':
+            if not path or axis == '/':
+                return None
+            axis = '/'
+            continue
+        xpath = compound_xpath(step)
+        if xpath is None:
+            return None
+        path += axis + xpath
+        axis = '//'
+    return path if path and axis == '//' else None
+
+
+class Scope(object):
+    """Text region selected by one CSS selector."""
+    def __init__(self, selector):
+        self.selector = selector
+        # Fails at config load on invalid syntax, whatever backend is used later
+        self.matcher = soupsieve.compile(selector)
+        self.strainer = None
+        m = simple_selector_pattern.match(selector.strip())
+        if m and any(m.groups()):
+            tag, element_id, classes = m.groups()
+            attrs = {}
+            if element_id:
+                attrs['id'] = element_id[1:]
+            classes = [c for c in classes.split('.') if c]
+            if classes:
+                # Strains on the first class (the raw attribute may hold several); the rest
+                # are checked on the parsed elements
+                attrs['class'] = re.compile(r'(?:^|\s){}(?:\s|$)'.format(re.escape(classes[0])))
+            self.strainer = bs4.SoupStrainer(tag or True, attrs=attrs)
+        self.xpath = selector_xpath(selector)
+        if self.xpath is None and CSSSelector is not None:
+            self.xpath = CSSSelector(selector).path
+
+    def uses_tree(self):
+        """Whether the text comes from a shared lxml tree of the page."""
+        return lxml is not None and self.xpath is not None
+
+    def text_from_tree(self, tree):
+        return normalize_text(' '.join(
+            ' '.join(el.xpath('.//text()[not(ancestor::script or ancestor::style)]'))
+            for el in tree.xpath(self.xpath)))
+
+    def text_from_soup(self, html_content, soup=None):
+        if soup is None and self.strainer is not None:
+            strained = bs4.BeautifulSoup(html_content, features=soup_features, parse_only=self.strainer)
+            # Top-level strained elements; nested matches are part of their text
+            elements = [el for el in strained.find_all(recursive=False) if self.matcher.match(el)]
+        else:
+            elements = self.matcher.select(soup if soup is not None else bs4.BeautifulSoup(
+                html_content, features=soup_features))
+        return normalize_text(' '.join(el.get_text(' ') for el in elements))
+
+
+class MatchRule(object):
+    def __init__(self, kind, pattern, selector=None, alert_when='absent', case_sensitive=False):
+        if kind not in ('literal', 'regex'):
+            raise ValueError("unknown rule type {!r}".format(kind))
+        if alert_when not in ALERT_WHEN:
+            raise ValueError("alert_when must be one of {}, not {!r}".format(ALERT_WHEN, alert_when))
+        self.kind = kind
+        self.pattern = pattern
+        self.selector = selector
+        self.alert_when = alert_when
+        flags = 0 if case_sensitive else re.I
+        if kind == 'literal':
+            # Matched against normalized text, so the phrase is normalized the same way
+            self.regex = re.compile(re.escape(normalize_text(pattern)), flags)
+        else:
+            try:
+                self.regex = re.compile(pattern, flags)
+            except re.error as e:
+                raise ValueError("invalid regex {!r}: {}".format(pattern, e))
+
+    def matches(self, text):
+        return self.regex.search(text) is not None
+
+    def fires(self, text):
+        """Whether the rule's alert condition holds for the text of its scope."""
+        return self.matches(text) == (self.alert_when == 'present')
+
+    def describe(self):
+        where = " in {}".format(self.selector) if self.selector else ""
+        return "{} {!r} is {}{}".format(self.kind, self.pattern, self.alert_when, where)
+
+
+class RuleSet(object):
+    """The compiled rules of one target, extracting each scope's text once per page."""
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.scopes = {}
+        self.page_scope = False
+        for rule in self.rules:
+            if rule.selector is None:
+                self.page_scope = True
+            elif rule.selector not in self.scopes:
+                self.scopes[rule.selector] = Scope(rule.selector)
+
+    def extract(self, html_content):
+        """Returns {selector (None for the whole page): normalized text} for the scopes the rules use."""
+        regions = {}
+        if self.page_scope:
+            regions[None] = page_text(html_content)
+        tree = soup = None
+        for selector, scope in self.scopes.items():
+            if scope.uses_tree():
+                if tree is None:
+                    markup = xml_declaration_pattern.sub('', html_content, count=1)
+                    tree = lxml.html.fromstring(markup) if markup.strip() else None
+                regions[selector] = scope.text_from_tree(tree) if tree is not None else ''
+            elif scope.strainer is not None:
+                regions[selector] = scope.text_from_soup(html_content)
+            else:
+                if soup is None:
+                    soup = bs4.BeautifulSoup(html_content, features=soup_features)
+                regions[selector] = scope.text_from_soup(html_content, soup)
+        return regions
+
+    def fired(self, regions):
+        """Indexes of the rules whose alert condition holds for the extracted regions."""
+        return {i for i, rule in enumerate(self.rules) if rule.fires(regions[rule.selector])}
+
+    def evaluate(self, html_content):
+        return self.fired(self.extract(html_content))
+
+    def signature(self):
+        """Hash identifying these rules, to tell whether saved state still applies to them."""
+        key = repr([(rule.kind, rule.pattern, rule.selector, rule.alert_when, rule.regex.flags) for rule in self.rules])
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def compile_rule(spec):
+    """
+    Compiles one rule from its config: a mapping with exactly one of `literal`
+    or `regex`, and optional `selector`, `alert_when` and `case_sensitive`.
+    A plain string is a literal that alerts when absent.
+    """
+    if isinstance(spec, str):
+        spec = {'literal': spec}
+    kinds = [kind for kind in ('literal', 'regex') if kind in spec]
+    if len(kinds) != 1:
+        raise ValueError("a rule needs exactly one of 'literal' or 'regex': {}".format(spec))
+    selector = spec.get('selector')
+    rule = MatchRule(kinds[0], str(spec[kinds[0]]), selector, spec.get('alert_when', 'absent'),
+                     bool(spec.get('case_sensitive', False)))
+    if selector is not None:
+        try:
+            soupsieve.compile(selector)
+        except Exception as e:
+            raise ValueError("invalid selector {!r}: {}".format(selector, e))
+    return rule
+
+
+def compile_rules(specs):
+    if not specs:
+        raise ValueError("a target needs at least one rule")
+    return RuleSet(compile_rule(spec) for spec in specs)
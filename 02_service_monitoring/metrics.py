@@ -0,0 +1,140 @@
+"""
+Monitor Metrics
+
+Description:
+    Per-target counters, gauges and latency histograms of the monitor, served
+    in the Prometheus text format on an optional local HTTP endpoint
+    (GET /metrics), so slowing polls are visible before an availability window
+    is missed. No client library is needed.
+
+    The 304 hit rate is rate(monitor_not_modified_total) / rate(monitor_polls_total).
+"""
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FETCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+ALERT_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'monitor_polls_total': ('counter', "Polls started.", None),
+    'monitor_errors_total': ('counter', "Polls that failed (after the fetch layer's retries).", None),
+    'monitor_not_modified_total': ('counter', "Polls answered with 304 Not Modified.", None),
+    'monitor_unchanged_body_total': ('counter', "Polls skipped because the body hash was unchanged.", None),
+    'monitor_response_bytes_total': ('counter', "Response body bytes received (decoded).", None),
+    'monitor_changes_total': ('counter', "Polls whose watched text changed.", None),
+    'monitor_alerts_total': ('counter', "Alerts queued for sending.", None),
+    'monitor_alerts_delivered_total': ('counter', "Alerts sent by email.", None),
+    'monitor_alerts_dropped_total': ('counter', "Alerts that could not be sent.", None),
+    'monitor_last_poll_timestamp_seconds': ('gauge', "Unix time of the last completed poll.", None),
+    'monitor_last_change_timestamp_seconds': ('gauge', "Unix time of the last change of the watched text.", None),
+    'monitor_next_poll_delay_seconds': ('gauge', "Delay before the next poll chosen by the scheduler.", None),
+    'monitor_fetch_seconds': ('histogram', "Time to fetch the page, retries included.", FETCH_BUCKETS),
+    'monitor_parse_seconds': ('histogram', "Time to extract and match the watched text.", PARSE_BUCKETS),
+    'monitor_alert_delivery_seconds': ('histogram', "Time from detection to the alert email being sent.",
+                                       ALERT_BUCKETS),
+}
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MonitorMetrics(object):
+    """Thread-safe metric values by name and target."""
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__values = {name: {} for name in METRICS}
+
+    def inc(self, name, target, value=1):
+        with self.__lock:
+            series = self.__values[name]
+            series[target] = series.get(target, 0) + value
+
+    def set(self, name, target, value):
+        with self.__lock:
+            self.__values[name][target] = value
+
+    def observe(self, name, target, value):
+        with self.__lock:
+            series = self.__values[name]
+            if target not in series:
+                series[target] = Histogram(METRICS[name][2])
+            series[target].observe(value)
+
+    def get(self, name, target):
+        with self.__lock:
+            return self.__values[name].get(target)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self.__lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} {}".format(name, kind))
+                for target, value in sorted(self.__values[name].items()):
+                    label = 'target="{}"'.format(escape_label(target))
+                    if kind != 'histogram':
+                        lines.append("{}{{{}}} {}".format(name, label, format_value(value)))
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, value.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, label, bound, cumulative))
+                    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, label, value.count))
+                    lines.append("{}_sum{{{}}} {}".format(name, label, format_value(value.sum)))
+                    lines.append("{}_count{{{}}} {}".format(name, label, value.count))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer(object):
+    """Serves MonitorMetrics.render() on GET /metrics from a background thread."""
+    def __init__(self, metrics, host='127.0.0.1', port=9108):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://{}:{}/metrics".format(host, self.httpd.server_port)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
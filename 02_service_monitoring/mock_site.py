@@ -0,0 +1,240 @@
+"""
+Local Mock Site and SMTP Sink for the Monitor
+
+Description:
+    Network-free stand-ins for what dormitory_monitor talks to, used by
+    bench_monitor.py:
+
+    - ScriptedSite: /page/<i> for any number of pages, each flipping between a
+      "no rooms" notice and a "rooms available" listing every `change_every`
+      seconds (with a per-page offset). The state is a function of time, so
+      the time of every flip is known exactly. Responses carry an ETag and
+      answer If-None-Match with 304, like a well-behaved site.
+    - SmtpSink: accepts the alert emails and records when each arrived. Uses
+      aiosmtpd when it is installed, else a minimal built-in SMTP server
+      (no TLS, no auth; enough for smtplib).
+
+Usage:
+    python mock_site.py --pages 100 --change-every 60 --port 8100 --smtp-port 8025
+"""
+import re
+import time
+import email
+import random
+import socket
+import argparse
+import threading
+import socketserver
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+NO_ROOMS_TEXT = "No rooms available at the moment."
+ROOMS_TEXT = "Rooms available: apply now."
+
+
+class ScriptedSite(object):
+    def __init__(self, pages=10, change_every=60.0, latency=0.0, page_size=20 * 1024, host='127.0.0.1', port=0,
+                 seed=1):
+        self.pages = pages
+        self.change_every = change_every
+        self.latency = latency
+        self.start_time = time.time()
+        self.requests = 0
+        self.not_modified = 0
+        rnd = random.Random(seed)
+        # Phase of each page within its cycle, so flips are spread over time
+        self.offsets = [rnd.uniform(0, change_every) for _ in range(pages)]
+        self.padding = ''.join('<p class="filler">Housing news item {}.</p>'.format(i)
+                               for i in range(page_size // 40))
+        self.__lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; with Nagle on, keep-alive requests stall ~40 ms on delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                site.handle(self)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 128
+        self.url = "http://{}:{}".format(host, self.httpd.server_port)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def page_url(self, page):
+        return "{}/page/{}".format(self.url, page)
+
+    def period(self, page, now=None):
+        """Index of the page's current state; odd periods show rooms."""
+        return int(((now or time.time()) - self.start_time + self.offsets[page]) // self.change_every)
+
+    def available_since(self, page, until):
+        """Start times of the page's rooms-available periods that began before `until`."""
+        times = []
+        k = 1
+        while True:
+            start = self.start_time + k * self.change_every - self.offsets[page]
+            if start >= until:
+                return times
+            times.append(start)
+            k += 2
+
+    def render(self, page, period):
+        notice = ROOMS_TEXT if period % 2 else NO_ROOMS_TEXT
+        return ('<html><head><title>Housing {0}</title><script>var token = "{2}";</script></head><body>'
+                '<div class="nav">Home | Housing | Contact</div>'
+                '<div id="offers" class="notice">{1}</div>{3}</body></html>').format(
+            page, notice, random.random(), self.padding)
+
+    def handle(self, handler):
+        with self.__lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        m = re.match(r'^/page/(\d+)$', handler.path)
+        if not m or int(m.group(1)) >= self.pages:
+            return self.respond(handler, 404, b'Not Found')
+        page = int(m.group(1))
+        period = self.period(page)
+        etag = '"{}-{}"'.format(page, period)
+        if handler.headers.get('If-None-Match') == etag:
+            with self.__lock:
+                self.not_modified += 1
+            return self.respond(handler, 304, b'', etag)
+        self.respond(handler, 200, self.render(page, period).encode('utf-8'), etag)
+
+    @staticmethod
+    def respond(handler, status, body, etag=None):
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/html; charset=utf-8')
+        handler.send_header('Content-Length', str(len(body)))
+        if etag:
+            handler.send_header('ETag', etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class SmtpSink(object):
+    """Records (arrival time, email.message.Message) of every email received."""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.messages = []
+        self.connections = 0
+        self.__lock = threading.Lock()
+        sink = self
+        if Controller is not None:
+            class Handler(object):
+                async def handle_DATA(self, server, session, envelope):
+                    sink.record(envelope.content)
+                    return '250 OK'
+
+            if not port:
+                port = self.free_port(host)
+            self.controller = Controller(Handler(), hostname=host, port=port)
+            self.server = None
+            self.port = port
+            return
+
+        class SmtpHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                sink.count_connection()
+                self.reply('220 mock-smtp ready')
+                data = None
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    if data is not None:
+                        if line.rstrip(b'\r\n') == b'.':
+                            sink.record(b''.join(data))
+                            data = None
+                            self.reply('250 OK')
+                        else:
+                            # Undo dot-stuffing
+                            data.append(line[1:] if line.startswith(b'..') else line)
+                        continue
+                    command = line.decode('ascii', errors='replace').strip().upper()
+                    if command.startswith('EHLO'):
+                        self.reply('250-mock-smtp')
+                        self.reply('250 8BITMIME')
+                    elif command.startswith('DATA'):
+                        data = []
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                    elif command.startswith('QUIT'):
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        # HELO, MAIL, RCPT, RSET, NOOP
+                        self.reply('250 OK')
+
+            def reply(self, text):
+                self.wfile.write((text + '\r\n').encode('ascii'))
+
+        self.controller = None
+        self.server = socketserver.ThreadingTCPServer((host, port), SmtpHandler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    @staticmethod
+    def free_port(host):
+        with socket.socket() as s:
+            s.bind((host, 0))
+            return s.getsockname()[1]
+
+    def count_connection(self):
+        with self.__lock:
+            self.connections += 1
+
+    def record(self, data):
+        with self.__lock:
+            self.messages.append((time.time(), email.message_from_bytes(data)))
+
+    def start(self):
+        if self.controller is not None:
+            self.controller.start()
+        else:
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.controller is not None:
+            self.controller.stop()
+        else:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scripted-change mock site and SMTP sink for the monitor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100, help="HTTP port (0 picks a free one)")
+    parser.add_argument("--smtp-port", type=int, default=8025, help="SMTP port (0 picks a free one)")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--change-every", type=float, default=60.0, help="Seconds between state flips of a page")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay in seconds")
+    args = parser.parse_args()
+
+    site = ScriptedSite(args.pages, args.change_every, args.latency, host=args.host, port=args.port)
+    sink = SmtpSink(args.host, args.smtp_port).start()
+    print(f"Serving {args.pages} pages at {site.page_url(0)} ... , SMTP sink on port {sink.port}", flush=True)
+    try:
+        site.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sink.stop()
+    print(f"{site.requests} requests ({site.not_modified} not modified), {len(sink.messages)} emails received")
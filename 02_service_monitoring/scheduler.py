@@ -0,0 +1,161 @@
+"""
+Adaptive Polling Scheduler
+
+Description:
+    Decides when each target is polled next, from what its polls have shown so
+    far, and caps the monitor's total request rate.
+
+    - A poll whose extracted text changed halves the target's interval (down
+      to min_interval); every unchanged poll stretches it by 20% (up to
+      max_interval), so static pages are polled less and changing ones more
+    - Hot windows (e.g. "Mon-Fri 08:00-10:00") cap the interval at
+      hot_interval while they are open
+    - Errors back off exponentially (base interval * 2^n, up to max_backoff)
+      with jitter; a 429's Retry-After is honoured as the minimum wait
+    - Every delay gets +-10% jitter so polls do not look machine-timed
+    - RequestBudget: a token bucket shared by all targets that limits polls per
+      minute; by default the volume fixed check_intervals would produce
+"""
+import re
+import time
+import random
+import asyncio
+from datetime import datetime
+
+SPEEDUP = 0.5
+SLOWDOWN = 1.2
+JITTER = 0.1
+DEFAULT_MAX_BACKOFF = 3600.0
+# Weight of the latest poll in the change rate average
+CHANGE_RATE_ALPHA = 0.2
+
+DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+hot_window_pattern = re.compile(
+    r'^(?:(?P<first>[a-z]{3})(?:-(?P<last>[a-z]{3}))?\s+)?(?P<start>\d{1,2}:\d{2})-(?P<end>\d{1,2}:\d{2})$')
+
+
+def parse_minutes(text):
+    hours, minutes = text.split(':')
+    total = int(hours) * 60 + int(minutes)
+    if int(minutes) > 59 or total > 24 * 60:
+        raise ValueError("invalid time {!r}".format(text))
+    return total
+
+
+def parse_hot_window(spec):
+    """
+    Parses "HH:MM-HH:MM", optionally preceded by a day or day range
+    ("Sat", "Mon-Fri"). Returns (weekdays, start minute, end minute).
+    Windows ending before they start run past midnight.
+    """
+    m = hot_window_pattern.match(spec.strip().lower())
+    if not m or (m.group('first') and m.group('first') not in DAYS) or (m.group('last') and m.group('last') not in DAYS):
+        raise ValueError("invalid hot window {!r} (expected e.g. 'Mon-Fri 08:00-10:00')".format(spec))
+    if m.group('first'):
+        first = DAYS.index(m.group('first'))
+        last = DAYS.index(m.group('last')) if m.group('last') else first
+        days = {(first + i) % 7 for i in range((last - first) % 7 + 1)}
+    else:
+        days = set(range(7))
+    return days, parse_minutes(m.group('start')), parse_minutes(m.group('end'))
+
+
+def in_hot_window(windows, now=None):
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for days, start, end in windows:
+        if start <= end:
+            if now.weekday() in days and start <= minute < end:
+                return True
+        # Past midnight: the late part belongs to the window's day, the early part to the next day
+        elif (now.weekday() in days and minute >= start) or ((now.weekday() - 1) % 7 in days and minute < end):
+            return True
+    return False
+
+
+class PollStats(object):
+    """Counters of one target's polls."""
+    def __init__(self):
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        # Moving average of the fraction of polls that saw a change
+        self.change_rate = 0.0
+        self.last_change = None
+
+
+class AdaptiveSchedule(object):
+    def __init__(self, base_interval, min_interval=None, max_interval=None, hot_windows=(), hot_interval=None,
+                 max_backoff=DEFAULT_MAX_BACKOFF):
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min_interval) if min_interval is not None else self.base_interval / 4
+        self.max_interval = float(max_interval) if max_interval is not None else self.base_interval * 4
+        if not self.min_interval <= self.base_interval <= self.max_interval:
+            raise ValueError("expected min_interval <= check_interval <= max_interval")
+        self.hot_windows = [parse_hot_window(spec) for spec in hot_windows]
+        self.hot_interval = float(hot_interval) if hot_interval is not None else self.min_interval
+        self.max_backoff = max(float(max_backoff), self.base_interval)
+        self.interval = self.base_interval
+        self.stats = PollStats()
+        self.__retry_after = None
+
+    def record_success(self, changed):
+        stats = self.stats
+        stats.polls += 1
+        stats.consecutive_errors = 0
+        stats.change_rate += CHANGE_RATE_ALPHA * ((1.0 if changed else 0.0) - stats.change_rate)
+        if changed:
+            stats.changes += 1
+            stats.last_change = time.time()
+            self.interval = max(self.min_interval, self.interval * SPEEDUP)
+        else:
+            self.interval = min(self.max_interval, self.interval * SLOWDOWN)
+
+    def record_error(self, retry_after=None):
+        self.stats.polls += 1
+        self.stats.errors += 1
+        self.stats.consecutive_errors += 1
+        self.__retry_after = retry_after
+
+    def next_delay(self, now=None):
+        """Seconds until the next poll, jittered."""
+        errors = self.stats.consecutive_errors
+        if errors:
+            delay = min(self.max_backoff, self.base_interval * 2 ** (errors - 1))
+            # Full jitter over the upper half, so targets failing together spread out
+            delay = random.uniform(delay / 2, delay)
+            if self.__retry_after is not None:
+                delay = max(delay, min(self.__retry_after, self.max_backoff))
+            return delay
+        delay = self.interval
+        if self.hot_windows and in_hot_window(self.hot_windows, now):
+            delay = min(delay, self.hot_interval)
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class RequestBudget(object):
+    """
+    Token bucket shared by all targets of one event loop: at most `per_minute`
+    polls per minute on average, with bursts of up to `burst` polls.
+    """
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.burst = burst if burst is not None else max(1.0, self.rate * 10)
+        self.__tokens = self.burst
+        self.__last = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        # Take a token now; a negative balance is the wait until it is refilled
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate) - 1
+        self.__last = now
+        if self.__tokens < 0:
+            await asyncio.sleep(-self.__tokens / self.rate)
+
+
+def baseline_budget(intervals):
+    """Polls per minute that fixed intervals would produce."""
+    return sum(60.0 / interval for interval in intervals if interval > 0)
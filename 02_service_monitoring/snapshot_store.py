@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot Store
+
+Description:
+    SQLite history of what the monitor has seen, so a restart continues where
+    the last run stopped:
+
+    - Per-target state (rules that were firing, ETag / Last-Modified, body and
+      extract hashes), restored at startup: a rule that was already firing is
+      not alerted again, and one that started firing while the monitor was
+      down is still alerted
+    - Snapshots of the normalized text the rules extracted (not whole pages),
+      stored only when it changed, zlib-compressed and deduplicated by hash
+      (a page flipping between two states stores two blobs), and pruned to the
+      last `history_limit` per target
+    - diff_regions(): a word-level diff of two extracts, for alert emails
+
+Layout (one SQLite file):
+    state(target, rules, fired, etag, last_modified, body_hash, region_hash, updated)
+    snapshots(id, target, taken, hash)
+    blobs(hash, data)
+"""
+import json
+import time
+import zlib
+import sqlite3
+import difflib
+import threading
+
+DEFAULT_HISTORY_LIMIT = 100
+MAX_DIFF_CHARS = 2000
+
+
+def encode_regions(regions):
+    # The whole-page region's key is None, which JSON objects cannot hold
+    return zlib.compress(json.dumps(sorted(regions.items(), key=str), ensure_ascii=False).encode('utf-8'))
+
+
+def decode_regions(data):
+    return {selector: text for selector, text in json.loads(zlib.decompress(data).decode('utf-8'))}
+
+
+class SnapshotStore(object):
+    def __init__(self, path, history_limit=DEFAULT_HISTORY_LIMIT):
+        self.path = path
+        self.history_limit = history_limit
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.executescript(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " target TEXT PRIMARY KEY,"
+            " rules TEXT NOT NULL,"
+            " fired TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " body_hash TEXT,"
+            " region_hash TEXT,"
+            " updated REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " target TEXT NOT NULL,"
+            " taken REAL NOT NULL,"
+            " hash TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS snapshots_target ON snapshots (target, id);"
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL);"
+        )
+        self.__conn.commit()
+
+    def load_state(self, target):
+        """The saved state of a target as a dict, or None."""
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT rules, fired, etag, last_modified, body_hash, region_hash FROM state WHERE target = ?",
+                (target,)).fetchone()
+        if row is None:
+            return None
+        return {'rules': row[0], 'fired': json.loads(row[1]), 'etag': row[2], 'last_modified': row[3],
+                'body_hash': row[4], 'region_hash': row[5]}
+
+    def save(self, target, state, regions=None, region_hash=None):
+        """
+        Saves a target's state and, if given and different from its latest
+        snapshot, the extracted regions, in one transaction.
+        """
+        with self.__lock, self.__conn:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO state (target, rules, fired, etag, last_modified, body_hash, region_hash,"
+                " updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (target, state['rules'], json.dumps(state['fired']), state.get('etag'), state.get('last_modified'),
+                 state.get('body_hash'), state.get('region_hash'), time.time()))
+            if regions is None or self.__latest_hash(target) == region_hash:
+                return
+            self.__conn.execute("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+                                (region_hash, encode_regions(regions)))
+            self.__conn.execute("INSERT INTO snapshots (target, taken, hash) VALUES (?, ?, ?)",
+                                (target, time.time(), region_hash))
+            self.__prune(target)
+
+    def latest(self, target):
+        """Regions of the target's latest snapshot, or None."""
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT blobs.data FROM snapshots JOIN blobs ON blobs.hash = snapshots.hash"
+                " WHERE snapshots.target = ? ORDER BY snapshots.id DESC LIMIT 1", (target,)).fetchone()
+        return decode_regions(row[0]) if row else None
+
+    def history(self, target, limit=10):
+        """[(taken, regions)] of the target's latest snapshots, newest first."""
+        with self.__lock:
+            rows = self.__conn.execute(
+                "SELECT snapshots.taken, blobs.data FROM snapshots JOIN blobs ON blobs.hash = snapshots.hash"
+                " WHERE snapshots.target = ? ORDER BY snapshots.id DESC LIMIT ?", (target, limit)).fetchall()
+        return [(taken, decode_regions(data)) for taken, data in rows]
+
+    def __latest_hash(self, target):
+        row = self.__conn.execute("SELECT hash FROM snapshots WHERE target = ? ORDER BY id DESC LIMIT 1",
+                                  (target,)).fetchone()
+        return row[0] if row else None
+
+    def __prune(self, target):
+        old = self.__conn.execute(
+            "SELECT id, hash FROM snapshots WHERE target = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (target, self.history_limit)).fetchall()
+        if not old:
+            return
+        self.__conn.executemany("DELETE FROM snapshots WHERE id = ?", [(row[0],) for row in old])
+        # Blobs still referenced by other snapshots (of any target) are kept
+        self.__conn.executemany(
+            "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM snapshots WHERE hash = ?)",
+            [(blob_hash, blob_hash) for blob_hash in {row[1] for row in old}])
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+def diff_regions(old, new, max_chars=MAX_DIFF_CHARS):
+    """
+    Word-level diff of two extracts ({selector: text}): one "- removed" /
+    "+ added" pair per changed span, labelled by selector, cut at max_chars.
+    """
+    lines = []
+    for selector in sorted(set(old) | set(new), key=str):
+        old_words = old.get(selector, '').split()
+        new_words = new.get(selector, '').split()
+        if old_words == new_words:
+            continue
+        label = "[{}] ".format(selector) if selector is not None else ""
+        matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == 'equal':
+                continue
+            if i2 > i1:
+                lines.append("{}- {}".format(label, ' '.join(old_words[i1:i2])))
+            if j2 > j1:
+                lines.append("{}+ {}".format(label, ' '.join(new_words[j1:j2])))
+    text = "\n".join(lines)
+    if len(text) > max_chars:
+        text = text[:max_chars] + "\n..."
+    return text
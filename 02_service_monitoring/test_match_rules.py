@@ -0,0 +1,31 @@
+from match_rules import compile_rules
+
+XHTML_PAGE = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" '
+    '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Housing</title></head><body>'
+    '<div class="nav">Home | Housing</div>'
+    '<div id="offers" class="notice box"><p>No rooms available at the moment.</p></div>'
+    '</body></html>'
+)
+
+
+def test_xhtml_page_with_encoding_declaration():
+    rules = compile_rules([
+        {'literal': 'No rooms available', 'selector': '#offers'},
+        {'literal': 'No rooms available', 'selector': 'div.notice > p'},
+        {'literal': 'Housing', 'selector': 'div:not(.nav)', 'alert_when': 'present'},
+        {'literal': 'No rooms available'},
+    ])
+    regions = rules.extract(XHTML_PAGE)
+    assert regions['#offers'] == "No rooms available at the moment."
+    assert regions['div.notice > p'] == "No rooms available at the moment."
+    assert 'Housing' not in regions['div:not(.nav)']
+    assert "No rooms available at the moment." in regions[None]
+    assert rules.fired(regions) == set()
+
+
+def test_xhtml_page_with_byte_order_mark():
+    regions = compile_rules([{'literal': 'No rooms', 'selector': '#offers'}]).extract('\ufeff' + XHTML_PAGE)
+    assert regions['#offers'] == "No rooms available at the moment."
@@ -0,0 +1,97 @@
+import time
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+
+from scheduler import (AdaptiveSchedule, RequestBudget, parse_hot_window, in_hot_window, baseline_budget,
+                       JITTER, DEFAULT_MAX_BACKOFF)
+
+
+def test_default_bounds_and_validation():
+    schedule = AdaptiveSchedule(100)
+    assert (schedule.min_interval, schedule.max_interval) == (25, 400)
+    with pytest.raises(ValueError):
+        AdaptiveSchedule(100, min_interval=200)
+
+
+def test_changes_speed_up_and_quiet_polls_slow_down():
+    schedule = AdaptiveSchedule(100, min_interval=30, max_interval=300)
+    schedule.record_success(changed=True)
+    assert schedule.interval == 50
+    schedule.record_success(changed=True)
+    schedule.record_success(changed=True)
+    assert schedule.interval == 30
+    for _ in range(50):
+        schedule.record_success(changed=False)
+    assert schedule.interval == 300
+    assert (schedule.stats.polls, schedule.stats.changes) == (53, 3)
+
+
+def test_delay_is_jittered_around_the_interval():
+    schedule = AdaptiveSchedule(100)
+    delays = [schedule.next_delay() for _ in range(200)]
+    assert all(100 * (1 - JITTER) <= delay <= 100 * (1 + JITTER) for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_errors_back_off_exponentially_up_to_the_cap():
+    random.seed(1)
+    schedule = AdaptiveSchedule(100, max_backoff=1000)
+    for errors, expected in [(1, 100), (2, 200), (3, 400), (4, 800), (5, 1000), (6, 1000)]:
+        schedule.record_error()
+        delay = schedule.next_delay()
+        assert expected / 2 <= delay <= expected, errors
+    # A success resets the backoff
+    schedule.record_success(changed=False)
+    assert schedule.next_delay() <= 100 * 1.2 * (1 + JITTER)
+
+
+def test_retry_after_is_a_minimum_within_max_backoff():
+    schedule = AdaptiveSchedule(10)
+    schedule.record_error(retry_after=120)
+    assert schedule.next_delay() == 120
+    schedule.record_error(retry_after=10 ** 6)
+    assert schedule.next_delay() == DEFAULT_MAX_BACKOFF
+
+
+def test_hot_window_caps_the_interval():
+    schedule = AdaptiveSchedule(300, hot_windows=["Mon-Fri 08:00-10:00"], hot_interval=60)
+    monday_9am = datetime(2024, 1, 1, 9, 0)
+    saturday_9am = datetime(2024, 1, 6, 9, 0)
+    assert schedule.next_delay(monday_9am) <= 60 * (1 + JITTER)
+    assert schedule.next_delay(saturday_9am) >= 300 * (1 - JITTER)
+
+
+def test_hot_window_parsing():
+    assert parse_hot_window("08:00-10:00") == (set(range(7)), 480, 600)
+    assert parse_hot_window("Sat-Mon 22:00-02:00") == ({5, 6, 0}, 1320, 120)
+    for spec in ["Mon-Fri", "25:00-26:00", "Foo 08:00-09:00", "08:60-09:00"]:
+        with pytest.raises(ValueError):
+            parse_hot_window(spec)
+
+
+def test_hot_window_past_midnight_belongs_to_its_start_day():
+    windows = [parse_hot_window("Fri 22:00-02:00")]
+    assert in_hot_window(windows, datetime(2024, 1, 5, 23, 0))  # Friday night
+    assert in_hot_window(windows, datetime(2024, 1, 6, 1, 0))  # early Saturday
+    assert not in_hot_window(windows, datetime(2024, 1, 6, 23, 0))
+    assert not in_hot_window(windows, datetime(2024, 1, 5, 1, 0))
+
+
+def test_budget_allows_a_burst_then_paces():
+    async def take(budget, count):
+        started = time.monotonic()
+        for _ in range(count):
+            await budget.acquire()
+        return time.monotonic() - started
+
+    # 10 polls per second with bursts of 2: the 3 polls past the burst wait ~0.1 s each
+    elapsed = asyncio.run(take(RequestBudget(600, burst=2), 5))
+    assert 0.25 <= elapsed < 0.6
+    assert asyncio.run(take(RequestBudget(0), 100)) < 0.05
+
+
+def test_baseline_budget():
+    assert baseline_budget([60, 30, 0]) == 3.0
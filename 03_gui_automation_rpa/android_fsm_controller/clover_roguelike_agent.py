@@ -8,24 +8,25 @@ Description:
 
 Key Features:
     - Graph Traversal: Scans the screen to find valid next moves.
-    - Two-Pass Verification: Uses Template Matching followed by Structural Similarity check to filter disabled nodes.
+    - Two-Pass Verification: Uses Template Matching followed by a batched color check to filter disabled (grayed-out) nodes.
     - OCR Integration: Reads event titles to select optimal rewards based on a JSON strategy file.
 """
 
 import sys
 import os
-import time
 import math
 import random
 import json
 import codecs
+import argparse
 import cv2
 
 # --- Path Setup for 'utils' module ---
 # Allows importing from parent directory's 'utils' folder
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils import ADBShell, img_utils, baidu_ocr
+from utils import ADBShell, img_utils, baidu_ocr, timing
+from utils.debug_logger import DebugFrameLogger
 try:
     from config.config import SCREEN_SHOOT_SAVE_PATH, RES_PATH
 except ImportError:
@@ -53,21 +54,23 @@ GIFT_BOX = (((234, 265), (210, 210)), ((607, 265), (210, 210)), ((981, 265), (21
 OPT_SPACE = 120
 PATH_ANGLE = 28
 
+# Default upper bounds (seconds) for readiness waits; tuned from recorded waits by
+# timing.suggest_timeout() where each wait happens
+PERFORM_TIMEOUT = 60
+RESTART_TIMEOUT = 60
+
 # Assets Loading
 template_names = [
     "normal_battle.png", "elite_battle.png", "normal_boss.png",
     "super_boss.png", "special_boss.png", "loot.png", "event.png", "shop.png"
 ]
 templates = [os.path.join(RES_PATH, t) for t in template_names]
+# Filled by load_templates() on first use; candidates are cropped from the in-memory screen and compared against these
 template_size = []
+template_imgs = []
 
-# Load template dimensions
-for tpl_path in templates:
-    tpl_img = cv2.imread(tpl_path)
-    if tpl_img is not None:
-        template_size.append(tpl_img.shape[1::-1])
-    else:
-        template_size.append((0, 0)) # Placeholder for missing assets
+# Optional DebugFrameLogger, enabled with --log
+debug_logger = None
 
 # Load Event Strategy JSON
 try:
@@ -102,6 +105,20 @@ gift_template = (
     os.path.join(RES_PATH, "gift_lv_up.png"), 
     os.path.join(RES_PATH, "gift_artifact.png")
 )
+gift_template_imgs = []
+
+def load_templates():
+    """Reads the node and gift templates once, on first use rather than at import."""
+    if template_imgs:
+        return
+    for tpl_path in templates:
+        tpl_img = cv2.imread(tpl_path)
+        template_imgs.append(tpl_img)
+        if tpl_img is not None:
+            template_size.append(tpl_img.shape[1::-1])
+        else:
+            template_size.append((0, 0)) # Placeholder for missing assets
+    gift_template_imgs.extend(cv2.imread(path, 0) for path in gift_template)
 
 def find_clickable_item(client):
     """
@@ -114,7 +131,7 @@ def find_clickable_item(client):
         if find_cnt > 10:
             restart_game(client)
             up_flag = -1
-        client.get_screen_shoot()
+        client.get_screen_shot()
         for i in range(0, 7):
             loc = img_utils.match_tpl_loc(DEFAULT_SCREENSHOT, templates[i])
             if loc != [-1, -1]:
@@ -126,9 +143,10 @@ def scan_for_interactive_elements(client):
     """
     Main Logic: Graph Traversal.
     Scans the current screen to identify all reachable nodes (Battle, Event, Shop).
-    Uses a hybrid recognition approach (Template Matching + Structural Comparison).
+    Uses a hybrid recognition approach (Template Matching + batched Color Verification).
     """
     print("Scanning for next stage nodes...")
+    load_templates()
     find_max_time = 10
     all_items = []
     find_cnt = 0
@@ -144,25 +162,33 @@ def scan_for_interactive_elements(client):
             print("Error: No clickable objects found.")
             return []
 
-        client.get_screen_shoot()
+        client.get_screen_shot()
+        screen = cv2.imread(DEFAULT_SCREENSHOT)
+        if screen is None:
+            find_cnt += 1
+            continue
+        screen_gray = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
         
         for i in range(len(templates)):
+            if template_imgs[i] is None:
+                continue
+            tpl_gray = cv2.cvtColor(template_imgs[i], cv2.COLOR_BGR2GRAY)
             # 1. Broad Phase: Template Matching
-            locs = img_utils.match_tpl_loc_multi(DEFAULT_SCREENSHOT, templates[i], 0.9)
-            
-            if locs != [-1, -1]:
-                for loc in locs:
-                    # Crop the potential region for detailed analysis
-                    crop_name = os.path.join(SCREEN_SHOOT_SAVE_PATH, "item_crop.png")
-                    client.get_screen_shoot(crop_name, screen_range=(loc, tuple(template_size[i])))
-                    
-                    if img_utils.image_compare(crop_name, templates[i]):
-                        # 2. Narrow Phase: Structural Analysis (RGB check)
-                        # Specific check for Elite/Boss nodes to distinguish disabled (gray) vs active nodes
-                        if i == 1 or i == 2:
-                            if not img_utils.image_compare_RGB(crop_name, templates[i]):
-                                continue # Skip if node is disabled (grayed out)
-                        all_items.append((i, locs))
+            locs = img_utils.match_cv2_tpl_loc_multi(screen_gray, tpl_gray, 0.9)
+            if locs == [-1, -1]:
+                continue
+
+            # 2. Narrow Phase: Color Verification of all candidates in one batched call
+            # Distinguishes active nodes from disabled (grayed-out) ones, e.g. Elite/Boss nodes
+            crops = [img_utils.get_img_part(screen, (loc, tuple(template_size[i]))) for loc in locs]
+            active = img_utils.batch_color_compare(crops, template_imgs[i])
+            if debug_logger:
+                for crop in crops:
+                    debug_logger.log(crop, "item_crop_" + template_names[i][:-4])
+
+            active_locs = [loc for loc, ok in zip(locs, active) if ok]
+            if active_locs:
+                all_items.append((i, active_locs))
         
         if all_items:
             return all_items
@@ -175,12 +201,22 @@ def restart_game(client):
     """Error Recovery: Restarts the application and navigates back to game."""
     print("State Recovery: Restarting Application...")
     client.stop_app(PACKET_NAME)
-    time.sleep(2)
     client.start_app(PACKET_NAME + "/com.hm.proj212.UnityPlayerActivity")
-    time.sleep(30)
+    # Loading screens animate; the welcome screen is the first to hold still
+    timeout = timing.suggest_timeout("clover:restart", RESTART_TIMEOUT)
+    wait_for_screen_settle(client, timeout, settle_time=3, transition="clover:restart")
     # Dismiss welcome screen
     client.get_mouse_click_random(((10, 10), (710, 395)))
-    time.sleep(10)
+    wait_for_screen_settle(client, 10, settle_time=1, transition="clover:welcome->map")
+
+def read_screen(client):
+    client.get_screen_shot()
+    return cv2.imread(DEFAULT_SCREENSHOT, 0)
+
+def wait_for_screen_settle(client, timeout=3, settle_time=0.0, transition=None):
+    """Blocks until consecutive screenshots stop changing (animations finished)."""
+    return timing.wait_until_stable(lambda: read_screen(client), timeout, settle_time=settle_time,
+                                    transition=transition)
 
 def swipe_screen_angle(client, x, angle):
     """Calculates vector for angular swipe to simulate natural movement."""
@@ -196,8 +232,8 @@ def handle_event_choice(client):
     3. Lookups optimal choice in 'event_opt.json'.
     4. Executes choice.
     """
-    time.sleep(5)
-    client.get_screen_shoot("event_title.png", EVENT_TITLE_BOX)
+    wait_for_screen_settle(client, 5, transition="clover:event_open")
+    client.get_screen_shot("event_title.png", EVENT_TITLE_BOX)
     
     # OCR Call
     title_text = baidu_ocr.image2text(os.path.join(SCREEN_SHOOT_SAVE_PATH, "event_title.png"))
@@ -211,7 +247,7 @@ def handle_event_choice(client):
             box_top_left = (EVENT_OPT_BOX[0][0], EVENT_OPT_BOX[0][1] + opt_index * OPT_SPACE)
             box_size = EVENT_OPT_BOX[1]
             client.get_mouse_click_random((box_top_left, box_size))
-            time.sleep(1)
+            wait_for_screen_settle(client, 2)
             
             if title_text == "Unknown Crystal": # Specific logic for special event
                 handle_loot_skip(client)
@@ -230,30 +266,33 @@ def handle_loot_skip(client):
     return False
 
 def block_until_img_exist(client, template_key, block_max_time=6):
-    """Blocking wait until a UI element appears."""
-    wait_time = 0
+    """Blocking wait until a UI element appears or `block_max_time` seconds elapse."""
     box = box_map.get(template_key)
     tpl_path = res_map.get(template_key)
-    
-    client.get_screen_shoot(screen_range=box)
-    
-    while not img_utils.image_compare(DEFAULT_SCREENSHOT, tpl_path):
-        time.sleep(0.75)
-        client.get_screen_shoot(screen_range=box)
-        if wait_time >= block_max_time:
-            print(f"Timeout waiting for {template_key}")
-            return False
-        wait_time += 1
+
+    def visible():
+        client.get_screen_shot(screen_range=box)
+        return img_utils.image_compare(DEFAULT_SCREENSHOT, tpl_path)
+
+    if not timing.wait_until(visible, block_max_time, 0.75, f"clover:wait:{template_key}"):
+        print(f"Timeout waiting for {template_key}")
+        return False
     return True
 
 def handle_gift_selection(client):
     """Selects buff/gift based on priority."""
+    load_templates()
+    screen = read_screen(client)
+    if screen is None:
+        return False
     for i in range(3):
-        client.get_screen_shoot("gift.png", screen_range=GIFT_BOX[i])
+        gift = img_utils.get_img_part(screen, GIFT_BOX[i])
+        if debug_logger:
+            debug_logger.log(gift, "gift_{}".format(i))
         for j in range(3):
-            if img_utils.image_compare(os.path.join(SCREEN_SHOOT_SAVE_PATH, "gift.png"), gift_template[j]):
+            if img_utils.image_cv2_compare(gift, gift_template_imgs[j]):
                 client.get_mouse_click_random(GIFT_BOX[i])
-                time.sleep(0.5)
+                wait_for_screen_settle(client, 1)
                 client.get_mouse_click_random(box_map.get("confirm"))
                 if j == 2: # Artifact needs skip
                     handle_loot_skip(client)
@@ -262,7 +301,7 @@ def handle_gift_selection(client):
 def enter_portal(client):
     client.get_mouse_click_random(PORTAL_BOX)
     client.get_mouse_click_random(PORTAL_BOX)
-    time.sleep(3)
+    wait_for_screen_settle(client, 3, transition="clover:portal")
 
 def process_node_action(client, point_type, loc, current_state):
     """Finite State Machine logic for handling different node types."""
@@ -273,41 +312,40 @@ def process_node_action(client, point_type, loc, current_state):
     hitbox = ((loc[0], loc[1] + 125), (93, 33)) 
     for _ in range(3):
         client.get_mouse_click_random(hitbox)
-    time.sleep(2)
+    wait_for_screen_settle(client, 2)
     
     # Battle Nodes (0-4)
     if 0 <= point_type < 5:
         print("Waiting for battle transition...")
-        client.get_screen_shoot(screen_range=START_PERFORM_BOX)
+        client.get_screen_shot(screen_range=START_PERFORM_BOX)
         if block_until_img_exist(client, "start_perform"):
             current_state = "PERFORMING"
             client.get_mouse_click_random(START_PERFORM_BOX)
             client.get_mouse_click_random(START_PERFORM_BOX)
-            time.sleep(5)
             
             # Wait for battle end
-            if block_until_img_exist(client, "end_perform", 20):
+            perform_timeout = timing.suggest_timeout("clover:wait:end_perform", PERFORM_TIMEOUT)
+            if block_until_img_exist(client, "end_perform", perform_timeout):
                 current_state = "FINISHED"
                 client.get_mouse_click_random(PERFORM_END_BOX)
-                time.sleep(2)
+                wait_for_screen_settle(client, 2)
                 # Clear dialogs
                 client.get_mouse_click_random(BOTTOM_BOX) 
                 client.get_mouse_click_random(BOTTOM_BOX)
                 
                 if point_type > 0:
-                    time.sleep(3)
                     handle_loot_skip(client)
                 if point_type > 2:
-                    time.sleep(3)
+                    wait_for_screen_settle(client, 3)
                     handle_gift_selection(client)
                 
-                time.sleep(3)
+                wait_for_screen_settle(client, 3, transition="clover:hp_up")
                 client.get_mouse_click_random(HP_UP_BOX)
-                time.sleep(0.5)
+                wait_for_screen_settle(client, 1)
                 client.get_mouse_click_random(CONFIRM_BOX)
                 
                 if point_type == 2 or point_type == 3:
-                    time.sleep(3)
+                    wait_for_screen_settle(client, 3)
                     enter_portal(client)
             return True
 
@@ -331,14 +369,37 @@ def process_node_action(client, point_type, loc, current_state):
              enter_portal(client)
              return True
 
+def check_setup():
+    """--dry-run: reports what a real run would trip over, without touching the device."""
+    paths = templates + list(gift_template) + list(res_map.values())
+    problems = ["Missing template {}".format(path) for path in paths if not os.path.exists(path)]
+    problems += ADBShell.ADBShell.setup_problems()
+    problems += baidu_ocr.setup_problems()
+    if not EVENT_CHOOSE:
+        problems.append("No event strategy loaded from {}".format(config_path))
+    for problem in problems:
+        print("[-] " + problem)
+    if not problems:
+        print("[+] Setup OK.")
+    return not problems
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Clover Roguelike Agent")
+    parser.add_argument("--log", action='store_true', help="Log candidate crops in the background")
+    parser.add_argument("--dry-run", action='store_true', help="Check templates, adb and OCR setup, then exit")
+    args = parser.parse_args()
+    if args.dry_run:
+        sys.exit(0 if check_setup() else 1)
+    if args.log:
+        debug_logger = DebugFrameLogger(os.path.join(SCREEN_SHOOT_SAVE_PATH, "clover_log"))
+
     state = "MAP_TRAVERSAL"
     client = ADBShell.ADBShell()
     
     print("Clover Agent Started.")
     while True:
         next_flag = False
-        client.get_screen_shoot()
+        client.get_screen_shot()
         
         # Step 1: Scan for nodes
         interactive_nodes = scan_for_interactive_elements(client)
@@ -12,7 +12,6 @@ Description:
 
 import sys
 import os
-import time
 import argparse
 import cv2
 from enum import Enum
@@ -20,7 +19,8 @@ from enum import Enum
 # --- Path Setup ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils import ADBShell, img_utils, baidu_ocr
+from utils import ADBShell, img_utils, baidu_ocr, timing
+from utils.debug_logger import DebugFrameLogger
 try:
     from config.config import SCREEN_SHOOT_SAVE_PATH, RES_PATH
 except ImportError:
@@ -31,6 +31,11 @@ except ImportError:
 PACKET_NAME = "com.linegames.dcglobal"
 DEFAULT_SCREENSHOT = os.path.join(SCREEN_SHOOT_SAVE_PATH, "screenshot.png")
 
+# Default upper bounds (seconds) for readiness waits; tuned from recorded waits by
+# timing.suggest_timeout() where each wait happens
+BATTLE_TIMEOUT = 560
+RESTART_TIMEOUT = 90
+
 # Load Templates
 TEMPLATE_NAMES = [
     "boss_level", "slayer_button", "slayer", "battle_start", "finished_boss",
@@ -39,15 +44,15 @@ TEMPLATE_NAMES = [
     "confirm_sort", "full_hp_in_boss", "refresh_raid", "amplification", "raid"
 ]
 
+# Template sizes are read on first use, not at import
 template_size = {}
-for tpl_name in TEMPLATE_NAMES:
-    path = os.path.join(RES_PATH, tpl_name + ".png")
-    tpl_img = cv2.imread(path)
-    if tpl_img is not None:
-        template_size[tpl_name] = tpl_img.shape[1::-1]
 
+# Connects to the device on its first command
 client = ADBShell.ADBShell()
 
+# Grayscale frame of the last screenshot checked for a template, kept for --log
+last_screen = None
+
 class State(Enum):
     IN_RAID_LIST = 0
     IN_BATTLE = 1
@@ -72,7 +77,6 @@ def enter_slayer_mode():
     while block_until_img_exist("slayer_button", 2):
         client.get_mouse_click_random(get_box("slayer_button"))
     
-    time.sleep(5)
     if block_until_img_exist("slayer", 16):
         return block_until_img_exist("boss_level", 16)
     return False
@@ -84,21 +88,21 @@ def return_to_main_menu():
     while detect_current_state() != State.IN_MAINMENU:
         client.click_back_keyevent() 
         try_cnt += 1
-        time.sleep(3)
-        client.get_screen_shot()
+        timing.wait_until(lambda: detect_current_state() == State.IN_MAINMENU, 3, interval=1,
+                          transition="raid:back->main_menu")
         if try_cnt > 7:
             restart_game()
 
 def sort_boss_list():
     """Sorts boss list by HP using UI filters."""
     click_template("sort_boss")
-    time.sleep(0.5)
+    block_until_img_exist("sort_by_hp", 3)
     click_template("sort_by_hp")
-    time.sleep(2)
+    block_until_img_exist("no_participate", 3)
     click_template("no_participate") # Filter only new bosses
-    time.sleep(1)
+    block_until_img_exist("confirm_sort", 3)
     click_template("confirm_sort")
-    time.sleep(0.5)
+    wait_for_screen_settle(2, "raid:sort->list")
 
 def find_boss_in_list(consume_first=False):
     """
@@ -113,11 +117,9 @@ def find_boss_in_list(consume_first=False):
         
         if is_template_in_screenshot(target_template):
             click_template(target_template)
-            time.sleep(3)
-            client.get_screen_shot()
             
             # Double check inside boss room
-            if is_template_in_screenshot("full_hp_in_boss"):
+            if block_until_img_exist("full_hp_in_boss", 3):
                 while block_until_img_exist("battle_start", 2):
                     client.get_mouse_click_random(get_box("battle_start"))
                 return not is_boss_finished()
@@ -126,7 +128,7 @@ def find_boss_in_list(consume_first=False):
         else:
             # Refresh list if no suitable boss found
             click_template("refresh_raid")
-            time.sleep(1)
+            wait_for_screen_settle(2, "raid:refresh_list")
             if is_template_in_screenshot("sort_boss"):
                 sort_boss_list()
 
@@ -136,7 +138,7 @@ def enter_boss_combat():
         client.get_mouse_click_random(get_box("boss_level"))
     else:
         return False
-    time.sleep(2)
+    wait_for_screen_settle(3, "raid:boss_level->boss_detail")
     while block_until_img_exist("battle_start", 2):
         client.get_mouse_click_random(get_box("battle_start"))
     return not is_boss_finished()
@@ -150,15 +152,15 @@ def fetch_extra_tickets(count):
     return_to_main_menu()
     while block_until_img_exist("mailbox", 2):
         client.get_mouse_click_random(get_box("mailbox"))
-        time.sleep(1)
+        wait_for_screen_settle(2)
         
     while cnt_get < count:
         client.get_screen_shot()
         if is_template_in_screenshot("get_ticket"):
             client.get_mouse_click_random(get_box("get_ticket"))
-            time.sleep(1)
-            client.get_mouse_click_random(get_box("fetch"))
-            time.sleep(5)
+            if block_until_img_exist("fetch", 3):
+                client.get_mouse_click_random(get_box("fetch"))
+            wait_for_screen_settle(5, "raid:fetch_ticket")
             cnt_get += 1
         
         # Scroll up to find more
@@ -176,7 +178,8 @@ def return_to_raid_menu():
             max_try -= 1
             if max_try <= 0:
                 restart_game()
-            time.sleep(1)
+            timing.wait_until(lambda: detect_current_state() == State.IN_RAID_LIST, 2, interval=0.5,
+                              transition="raid:main_menu->raid_list")
         return True
 
 def is_boss_finished():
@@ -187,23 +190,18 @@ def is_boss_finished():
     return False
 
 def wait_for_battle_end():
-    cnt_wait = 0
-    time.sleep(60)
-    while not is_template_in_screenshot("complete_battle"):
-        time.sleep(10)
-        cnt_wait += 1
-        if cnt_wait > 50:
-            print("Battle Timeout.")
-            return False
+    """Polls for the result screen, returning as soon as the battle finishes."""
+    timeout = timing.suggest_timeout("raid:battle", BATTLE_TIMEOUT)
+    if not block_until_img_exist("complete_battle", timeout, interval=10, transition="raid:battle"):
+        print("Battle Timeout.")
+        return False
             
-    if is_template_in_screenshot("complete_battle"):
-        print("Battle Complete.")
-        # Click arbitrary area to close reward screen
-        client.get_mouse_click_random([[1819, 706], [70, 70]])
-        while detect_current_state() == State.IN_RAID_LIST:
-             time.sleep(1)
-        return True
-    return False
+    print("Battle Complete.")
+    # Click arbitrary area to close reward screen
+    client.get_mouse_click_random([[1819, 706], [70, 70]])
+    timing.wait_until(lambda: detect_current_state() != State.IN_RAID_LIST, 30, interval=1,
+                      transition="raid:result->raid_list")
+    return True
 
 # --- Helpers ---
 def get_box(template, is_light_judging=True):
@@ -211,14 +209,23 @@ def get_box(template, is_light_judging=True):
     loc = img_utils.match_tpl_loc(DEFAULT_SCREENSHOT, os.path.join(RES_PATH, template + ".png"), is_light_judging=is_light_judging)
     if loc == [-1, -1]:
         return [[0,0], [0,0]]
-    return [loc, template_size.get(template, [0,0])]
+    return [loc, get_template_size(template)]
+
+def get_template_size(template):
+    """(width, height) of a template, [0, 0] if it is missing; cached after the first read."""
+    if template not in template_size:
+        tpl_img = cv2.imread(os.path.join(RES_PATH, template + ".png"))
+        template_size[template] = tpl_img.shape[1::-1] if tpl_img is not None else [0, 0]
+    return template_size[template]
 
 def click_template(template):
     if is_template_in_screenshot(template):
         client.get_mouse_click_random(get_box(template))
 
 def is_template_in_screenshot(template_name):
+    global last_screen
     screenshot = cv2.imread(DEFAULT_SCREENSHOT, 0)
+    last_screen = screenshot
     tpl = cv2.imread(os.path.join(RES_PATH, template_name + ".png"), 0)
     
     loc = img_utils.match_tpl_loc(DEFAULT_SCREENSHOT, os.path.join(RES_PATH, template_name + ".png"), 0.7)
@@ -227,30 +234,35 @@ def is_template_in_screenshot(template_name):
         return False
     return img_utils.image_cv2_compare(img_utils.get_img_part(screenshot, box), tpl)
 
-def block_until_img_exist(template_name, block_max_time=6):
-    wait_time = 0
+def read_screen():
     client.get_screen_shot()
-    # Simplified blocking logic for brevity
-    while not is_template_in_screenshot(template_name):
-        time.sleep(1)
+    return cv2.imread(DEFAULT_SCREENSHOT, 0)
+
+def block_until_img_exist(template_name, block_max_time=6, interval=1, transition=None):
+    """Captures and checks until the template is visible or `block_max_time` seconds elapse."""
+    def visible():
         client.get_screen_shot()
-        if wait_time >= block_max_time:
-            return False
-        wait_time += 1
-    return True
+        return is_template_in_screenshot(template_name)
+    return timing.wait_until(visible, block_max_time, interval, transition or f"raid:wait:{template_name}")
+
+def wait_for_screen_settle(timeout=3, transition=None):
+    """Blocks until consecutive screenshots stop changing (animations finished)."""
+    return timing.wait_until_stable(read_screen, timeout, transition=transition)
 
 def restart_game():
     print("Restarting Game...")
     client.stop_app(PACKET_NAME)
-    time.sleep(2)
     client.start_app(PACKET_NAME + "/com.NextFloor.DestinyChild.MainActivity")
-    time.sleep(30)
-    for _ in range(10):
+
+    def at_main_menu():
         if detect_current_state() == State.IN_MAINMENU:
-            break
+            return True
         client.get_mouse_click_random(((900, 400), (110, 195)))
-        time.sleep(2)
-    time.sleep(6)
+        return False
+
+    timeout = timing.suggest_timeout("raid:restart->main_menu", RESTART_TIMEOUT)
+    timing.wait_until(at_main_menu, timeout, interval=2, transition="raid:restart->main_menu")
+    wait_for_screen_settle(6, "raid:main_menu_settle")
     return True
 
 def get_ticket_count():
@@ -262,6 +274,20 @@ def get_ticket_count():
         return [1] # Fallback
     return remain_ticket
 
+def check_setup():
+    """--dry-run: reports what a real run would trip over, without touching the device."""
+    problems = ["Missing template {}".format(os.path.join(RES_PATH, name + ".png"))
+                for name in TEMPLATE_NAMES if not os.path.exists(os.path.join(RES_PATH, name + ".png"))]
+    problems += ADBShell.ADBShell.setup_problems()
+    problems += baidu_ocr.setup_problems()
+    print(f"Timeouts: battle {timing.suggest_timeout('raid:battle', BATTLE_TIMEOUT):.0f}s, "
+          f"restart {timing.suggest_timeout('raid:restart->main_menu', RESTART_TIMEOUT):.0f}s")
+    for problem in problems:
+        print("[-] " + problem)
+    if not problems:
+        print("[+] Setup OK.")
+    return not problems
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Raid Bot")
     parser.add_argument("-n", type=int, default=10, help="Max Tickets")
@@ -269,10 +295,14 @@ if __name__ == '__main__':
     parser.add_argument("--slayer", action='store_true', help="Target Slayer Mode")
     parser.add_argument("--amplify", action='store_true', help="Use Damage Amplifier")
     parser.add_argument("--log", action='store_true', default=True, help="Screenshot logging")
+    parser.add_argument("--dry-run", action='store_true', help="Check templates, adb and OCR setup, then exit")
     
     args = parser.parse_args()
+    if args.dry_run:
+        sys.exit(0 if check_setup() else 1)
     
     ticket_limit = args.n
+    debug_logger = DebugFrameLogger(os.path.join(SCREEN_SHOOT_SAVE_PATH, "error_log")) if args.log else None
     state = detect_current_state()
     battles_fought = 0
     
@@ -304,7 +334,7 @@ if __name__ == '__main__':
                     state = State.IN_BATTLE
                 else:
                     client.click_back_keyevent()
-                    time.sleep(2)
+                    wait_for_screen_settle(2)
                     state = detect_current_state()
 
         elif state == State.IN_SLAYER_LIST:
@@ -324,11 +354,16 @@ if __name__ == '__main__':
             state = State.IN_RAID_LIST
             
         elif state == State.UNKNOWN_STATE:
-            if args.log:
-                client.get_screen_shot(file_name=f"error_log_{time.time()}.png")
+            if debug_logger:
+                # The frame detect_current_state() just checked, already in memory; encoding happens off-thread
+                debug_logger.log(last_screen, "error_log")
             
             # Retry logic
             if restart_game():
                 state = detect_current_state()
             else:
-                sys.exit(1)
\ No newline at end of file
+                sys.exit(1)
+
+    timing.print_timing_summary()
+    if debug_logger:
+        debug_logger.close()
\ No newline at end of file
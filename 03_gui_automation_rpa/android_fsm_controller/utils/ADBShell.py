@@ -5,8 +5,11 @@ Note:
 This module is based on an open-source ADB wrapper project (original source currently unavailable).
 It has been customized and extended to support specific automation requirements for this portfolio.
 Modifications include [change_default_tools or commands, input specific keyevent].
+
+The device is connected on the first command (or an explicit connect()), so
+constructing an ADBShell is free: importing a bot does not run adb or prompt
+for a device.
 """
-from cgi import print_arguments
 import os
 from config import ADB_ROOT, ADB_HOST, SCREEN_SHOOT_SAVE_PATH, ShellColor
 from PIL import Image
@@ -20,7 +23,6 @@ class ADBShell(object):
     def __init__(self):
         self.resolution = [1920, 1080]
         self.SCREEN_SHOOT_SAVE_PATH = SCREEN_SHOOT_SAVE_PATH
-        os.chdir(ADB_ROOT)
         self.ADB_ROOT = ADB_ROOT
         self.ADB_HOST = ADB_HOST
         self.__command = ".\\ADB\\win32\\adb.exe {tools} {command}"
@@ -28,10 +30,32 @@ class ADBShell(object):
         self.shell_color = ShellColor()
         self.__adb_tools = ""
         self.__adb_command = ""
+        self.__connected = False
+
+    @staticmethod
+    def adb_path():
+        return os.path.join(ADB_ROOT, "ADB", "win32", "adb.exe")
+
+    @staticmethod
+    def setup_problems():
+        """Reasons a run would fail before any adb command is sent."""
+        problems = []
+        if not os.path.exists(ADBShell.adb_path()):
+            problems.append("adb not found at {}".format(ADBShell.adb_path()))
+        if not os.path.isdir(SCREEN_SHOOT_SAVE_PATH):
+            problems.append("Screenshot directory {} does not exist".format(SCREEN_SHOOT_SAVE_PATH))
+        return problems
+
+    def connect(self):
+        """Connects to ADB_HOST and selects the device; run_cmd() calls this on first use."""
+        if self.__connected:
+            return
+        # Set first: the connect and device commands below go through run_cmd() too
+        self.__connected = True
+        os.chdir(self.ADB_ROOT)
         if self.ADB_ROOT != "" :
             self.__adb_connect()
         self.__choose_devices()
-        
 
     def __adb_connect(self):
         self.__adb_tools = "connect"
@@ -74,6 +98,10 @@ class ADBShell(object):
             3 : print command and print the return content
         :return:
         """
+        if not self.__connected:
+            tools, command = self.__adb_tools, self.__adb_command
+            self.connect()
+            self.__adb_tools, self.__adb_command = tools, command
         if DEBUG_LEVEL == 3:
             print(self.shell_color.H_OK_BLUE +
                   self.__command.format(
@@ -250,3 +278,4 @@ class ADBShell(object):
 
 if __name__ == '__main__':
     a = ADBShell()
+    a.connect()
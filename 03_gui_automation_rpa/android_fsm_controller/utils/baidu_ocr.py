@@ -3,7 +3,11 @@
 Baidu OCR API Wrapper
 
 Handles interaction with Baidu Cloud OCR services for text recognition.
+The AipOcr client is created on first use, so importing this module is cheap
+and works without the `baidu-aip` package until OCR is actually needed.
 """
+import importlib.util
+
 # NOTICE: Ensure actual API keys are NOT committed to version control.
 # Use environment variables or a local-only config file.
 try:
@@ -15,16 +19,31 @@ except ImportError:
     # Fallback for portfolio demonstration if config is missing
     APP_ID, API_KEY, SECRET_KEY = "DUMMY", "DUMMY", "DUMMY"
 
-from aip import AipOcr
+client = None
+
+def get_client():
+    """The AipOcr client, created on first call."""
+    global client
+    if client is None:
+        from aip import AipOcr
+        client = AipOcr(APP_ID, API_KEY, SECRET_KEY)
+    return client
 
-client = AipOcr(APP_ID, API_KEY, SECRET_KEY)
+def setup_problems():
+    """Reasons OCR would fail, found without importing `aip` or contacting Baidu."""
+    problems = []
+    if importlib.util.find_spec("aip") is None:
+        problems.append("baidu-aip package is not installed")
+    if not all(key and key != "DUMMY" for key in (APP_ID, API_KEY, SECRET_KEY)):
+        problems.append("Baidu OCR credentials are not set (config/baidu_aip_config.py)")
+    return problems
 
 def image2text(file_path):
     """Extracts text from an image file."""
     with open(file_path, 'rb') as fp:
         image = fp.read()
     
-    dic_result = client.basicGeneral(image)
+    dic_result = get_client().basicGeneral(image)
     if 'words_result' not in dic_result:
         return ""
         
@@ -39,7 +58,7 @@ def image2num(file_path):
     with open(file_path, "rb") as fp:
         image = fp.read()
    
-    res_image = client.numbers(image)   
+    res_image = get_client().numbers(image)   
     if 'words_result' not in res_image:
         return []
 
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous Debug Frame Logger
+
+Takes in-memory frames (NumPy arrays) from the main loop and encodes/writes them
+on a background worker thread, so diagnostics never block observation or actions.
+
+- Bounded queue: frames are dropped (and counted) instead of stalling the caller.
+- Rotation: the oldest files are deleted once the directory exceeds a file count
+  or total size, so week-long runs cannot fill the disk.
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+
+
+class DebugFrameLogger(object):
+    def __init__(self, log_dir, max_files=500, max_bytes=200 * 1024 * 1024, queue_size=16, ext=".png"):
+        self.log_dir = log_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.ext = ext
+        self.dropped = 0
+        self.written = 0
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__files = deque()
+        self.__total_bytes = 0
+        os.makedirs(log_dir, exist_ok=True)
+        self.__scan_existing()
+        self.__worker = threading.Thread(target=self.__run, name="DebugFrameLogger", daemon=True)
+        self.__worker.start()
+
+    def log(self, frame, tag="frame"):
+        """
+        Queues a frame for writing without blocking.
+        The frame is not copied, so the caller must not modify it afterwards.
+        Returns False if the queue was full and the frame was dropped.
+        """
+        if frame is None:
+            return False
+        try:
+            self.__queue.put_nowait((time.time(), tag, frame))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=5):
+        """Flushes pending frames (up to `timeout` seconds) and stops the worker."""
+        try:
+            self.__queue.put((0, None, None), timeout=timeout)
+        except queue.Full:
+            return
+        self.__worker.join(timeout)
+
+    def __run(self):
+        while True:
+            timestamp, tag, frame = self.__queue.get()
+            if tag is None:
+                break
+            try:
+                ok, buf = cv2.imencode(self.ext, frame)
+                if not ok:
+                    continue
+                file_name = "{}_{:.3f}{}".format(tag, timestamp, self.ext)
+                path = os.path.join(self.log_dir, file_name)
+                with open(path, "wb") as f:
+                    f.write(buf.tobytes())
+                self.__files.append((path, len(buf)))
+                self.__total_bytes += len(buf)
+                self.written += 1
+                self.__rotate()
+            except Exception as e:
+                print(f"Debug logger error: {e}")
+
+    def __rotate(self):
+        while self.__files and (len(self.__files) > self.max_files or self.__total_bytes > self.max_bytes):
+            path, size = self.__files.popleft()
+            self.__total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __scan_existing(self):
+        """Counts frames left by earlier runs so rotation limits apply across restarts."""
+        existing = []
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if name.endswith(self.ext) and os.path.isfile(path):
+                existing.append((os.path.getmtime(path), path, os.path.getsize(path)))
+        for _, path, size in sorted(existing):
+            self.__files.append((path, size))
+            self.__total_bytes += size
+        self.__rotate()
@@ -6,11 +6,12 @@ Provides helper functions for:
 - Template Matching (CV2)
 - Structural Similarity Calculation (SSIM)
 - Luminance analysis for UI element state detection
+- Frame differencing for screen-settle detection
+- Batched color verification (histograms + saturation) for active vs grayed-out elements
 """
 
 import cv2
 import numpy as np
-from skimage.metrics import structural_similarity
 import math
 
 def match_tpl_loc(target, tpl, threshold=0.8, log_level=0, is_light_judging=True):
@@ -72,6 +73,8 @@ def image_compare(img1_path, img2_path, threshold=0.7, log_level=0):
     return image_cv2_compare(img1, img2, threshold, log_level)
 
 def image_cv2_compare(img1, img2, threshold=0.7, log_level=0):
+    # Imported here: skimage pulls in scipy (~0.2s), which bot startup and --dry-run do not need
+    from skimage.metrics import structural_similarity
     try:
         (score, diff) = structural_similarity(img1, img2, full=True)
         if log_level == 1:
@@ -89,4 +92,97 @@ def light_means(src, box=None):
 
 def get_img_part(src, box):
     """Crops a part of the image based on the box coordinates."""
-    return src[box[0][1]:box[0][1]+box[1][1], box[0][0]:box[0][0]+box[1][0]]
\ No newline at end of file
+    return src[box[0][1]:box[0][1]+box[1][1], box[0][0]:box[0][0]+box[1][0]]
+
+def frame_difference(img1, img2):
+    """Mean absolute pixel difference between two equally sized frames."""
+    return cv2.absdiff(img1, img2).mean()
+
+def match_tpl_loc_multi(target, tpl, threshold=0.8, log_level=0):
+    """Finds all non-overlapping locations of a template image within a target image."""
+    img_target = cv2.imread(target, 0)
+    img_tpl = cv2.imread(tpl, 0)
+    if img_target is None or img_tpl is None:
+        return [-1, -1]
+    return match_cv2_tpl_loc_multi(img_target, img_tpl, threshold, log_level)
+
+def match_cv2_tpl_loc_multi(img_target, img_tpl, threshold=0.8, log_level=0):
+    """
+    Array version of match_tpl_loc_multi.
+    Keeps the best match in each template-sized neighbourhood (greedy non-maximum suppression).
+    """
+    result = cv2.matchTemplate(img_target, img_tpl, cv2.TM_CCOEFF_NORMED)
+    ys, xs = np.where(result >= threshold)
+    if len(xs) == 0:
+        return [-1, -1]
+    order = np.argsort(-result[ys, xs])
+    w, h = img_tpl.shape[1::-1]
+    kept = []
+    for k in order:
+        x, y = xs[k], ys[k]
+        if all(abs(x - kx) >= w or abs(y - ky) >= h for kx, ky in kept):
+            kept.append((int(x), int(y)))
+    if log_level == 1:
+        print(f"Matches: {len(kept)} (raw {len(xs)})")
+    return kept
+
+def image_compare_RGB(img1_path, img2_path, hist_threshold=0.7, saturation_ratio=0.5, log_level=0):
+    """Color-aware comparison of two images (active vs grayed-out UI elements)."""
+    img1 = cv2.imread(img1_path)
+    img2 = cv2.imread(img2_path)
+    if img1 is None or img2 is None:
+        return False
+    return image_cv2_compare_RGB(img1, img2, hist_threshold, saturation_ratio, log_level)
+
+def image_cv2_compare_RGB(img1, img2, hist_threshold=0.7, saturation_ratio=0.5, log_level=0):
+    return bool(batch_color_compare([img1], img2, hist_threshold, saturation_ratio, log_level)[0])
+
+def batch_color_compare(crops, tpl, hist_threshold=0.7, saturation_ratio=0.5, log_level=0, bins=16):
+    """
+    Verifies every candidate crop against a BGR template in one vectorized pass.
+    A crop passes if
+    1. its per-channel color histograms correlate with the template's (mean Pearson r >= hist_threshold), and
+    2. its mean saturation is at least `saturation_ratio` of the template's (grayed-out elements fail here).
+    Crops whose shape differs from the template fail. Returns a boolean array, one entry per crop.
+    """
+    mask = np.zeros(len(crops), dtype=bool)
+    valid = [k for k, crop in enumerate(crops) if crop is not None and crop.shape == tpl.shape]
+    if not valid or tpl.ndim != 3:
+        return mask
+    stack = np.stack([crops[k] for k in valid])
+
+    hists = color_histograms(stack, bins)
+    tpl_hist = color_histograms(tpl[np.newaxis], bins)[0]
+    # Pearson correlation per channel, averaged over channels
+    a = hists - hists.mean(axis=2, keepdims=True)
+    b = tpl_hist - tpl_hist.mean(axis=1, keepdims=True)
+    denom = np.sqrt((a ** 2).sum(axis=2) * (b ** 2).sum(axis=1))
+    corr = np.where(denom > 0, (a * b).sum(axis=2) / np.maximum(denom, 1e-12), 0).mean(axis=1)
+
+    sat = saturation_means(stack)
+    tpl_sat = saturation_means(tpl[np.newaxis])[0]
+    sat_ok = sat >= saturation_ratio * tpl_sat
+
+    mask[valid] = (corr >= hist_threshold) & sat_ok
+    if log_level == 1:
+        for k, c, s in zip(valid, corr, sat):
+            print(f"Crop {k}: Hist Corr {c:.3f}, Saturation {s:.1f} (template {tpl_sat:.1f})")
+    return mask
+
+def color_histograms(imgs, bins=16):
+    """Normalized per-channel histograms for a stack of images (N, H, W, C) -> (N, C, bins)."""
+    n, h, w, c = imgs.shape
+    q = (imgs.reshape(n, h * w, c).astype(np.int64) * bins) >> 8
+    # Offset each (image, channel) into its own bin range so a single bincount covers the batch
+    q += (np.arange(c) * bins)[np.newaxis, np.newaxis, :]
+    q += (np.arange(n) * c * bins)[:, np.newaxis, np.newaxis]
+    counts = np.bincount(q.ravel(), minlength=n * c * bins)
+    return counts.reshape(n, c, bins) / float(h * w)
+
+def saturation_means(imgs):
+    """Mean HSV saturation (0-255) of each image in a stack (N, H, W, 3)."""
+    imgs = imgs.astype(np.float32)
+    high = imgs.max(axis=3)
+    low = imgs.min(axis=3)
+    sat = np.where(high > 0, (high - low) / np.maximum(high, 1), 0) * 255
+    return sat.reshape(len(imgs), -1).mean(axis=1)
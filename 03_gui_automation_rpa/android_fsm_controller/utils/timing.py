@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Condition-based Timing Utilities
+
+Replaces fixed sleeps with bounded readiness waits:
+- wait_until: returns as soon as a condition holds (e.g. a template is visible).
+- wait_until_stable: returns once consecutive frames stop changing (screen settled).
+
+Every wait records its observed duration under a transition name, both in memory
+and in a CSV file, so default timeouts can be tuned from real runs. Only the last
+MAX_SAMPLES waits per transition are kept: the file is compacted to them when it
+grows past twice that, so reading it stays cheap however long the bots have run.
+"""
+
+import os
+import csv
+import time
+from collections import defaultdict, deque
+
+from utils import img_utils
+try:
+    from config import STORAGE_PATH
+except ImportError:
+    STORAGE_PATH = "./storage/"
+
+TIMING_LOG_PATH = os.path.join(STORAGE_PATH, "transition_timing.csv")
+# Waits kept per transition, in memory and in the log file
+MAX_SAMPLES = 200
+# Tuned timeouts stay below this multiple of the default, however often waits time out
+MAX_TIMEOUT_FACTOR = 4
+
+# transition -> last MAX_SAMPLES (timestamp, seconds, reached)
+_durations = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_history_loaded = False
+# Rows in the log file, including those since dropped from _durations
+_log_rows = 0
+
+
+def wait_until(condition, timeout, interval=0.5, transition=None, min_wait=0.0):
+    """
+    Polls `condition` until it returns True or `timeout` seconds elapse.
+    `min_wait` is a lower bound for transitions that can never finish sooner.
+    Returns True if the condition was met.
+    """
+    start = time.monotonic()
+    if min_wait > 0:
+        time.sleep(min_wait)
+    while True:
+        if condition():
+            record_duration(transition, time.monotonic() - start, True)
+            return True
+        if time.monotonic() - start >= timeout:
+            record_duration(transition, time.monotonic() - start, False)
+            return False
+        time.sleep(interval)
+
+
+def wait_until_stable(grab_frame, timeout, interval=0.5, settle_time=0.0, threshold=2.0, transition=None):
+    """
+    Waits until the screen settles: consecutive frames from `grab_frame` differ by less
+    than `threshold` (mean absolute pixel difference) for at least `settle_time` seconds.
+    Returns True if the screen settled before `timeout`.
+    """
+    state = {"prev": None, "since": None}
+
+    def settled():
+        frame = grab_frame()
+        if frame is None:
+            return False
+        prev, state["prev"] = state["prev"], frame
+        if prev is None or prev.shape != frame.shape or img_utils.frame_difference(prev, frame) >= threshold:
+            state["since"] = None
+            return False
+        if state["since"] is None:
+            state["since"] = time.monotonic()
+        return time.monotonic() - state["since"] >= settle_time
+
+    return wait_until(settled, timeout, interval, transition)
+
+
+def record_duration(transition, seconds, reached):
+    """Stores one observed wait, in memory and appended to TIMING_LOG_PATH."""
+    global _log_rows
+    if transition is None:
+        return
+    _load_history()
+    sample = (int(time.time()), seconds, reached)
+    _durations[transition].append(sample)
+    try:
+        os.makedirs(os.path.dirname(TIMING_LOG_PATH), exist_ok=True)
+        with open(TIMING_LOG_PATH, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(_log_row(transition, sample))
+        _log_rows += 1
+    except OSError as e:
+        print(f"Warning: Could not write timing log: {e}")
+        return
+    if _log_rows > 2 * sum(len(samples) for samples in _durations.values()):
+        _compact_log()
+
+
+def get_timing_stats():
+    """Returns {transition: {count, timeouts, mean, p95, max}} over successful waits."""
+    _load_history()
+    stats = {}
+    for transition, samples in _durations.items():
+        stats[transition] = _stats(samples)
+    return stats
+
+
+def _stats(samples):
+    reached = sorted(s for _, s, ok in samples if ok)
+    return {
+        "count": len(samples),
+        "timeouts": len(samples) - len(reached),
+        "mean": sum(reached) / len(reached) if reached else None,
+        "p95": reached[min(len(reached) - 1, int(len(reached) * 0.95))] if reached else None,
+        "max": reached[-1] if reached else None,
+    }
+
+
+def suggest_timeout(transition, default, margin=1.5, min_samples=10):
+    """
+    Tuned timeout for a transition: p95 of observed durations * margin, else `default`.
+    Timed-out waits count at the bound they gave up at, and the result is never below
+    the last bound that timed out, so timeouts raise the suggestion instead of only
+    successes lowering it (up to MAX_TIMEOUT_FACTOR * default).
+    Call it where the wait happens, not at import, so the history is read only when needed.
+    """
+    _load_history()
+    samples = _durations.get(transition)
+    if not samples or sum(1 for _, _, ok in samples if ok) < min_samples:
+        return default
+    durations = sorted(s for _, s, _ in samples)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    last_timeout = next((s for _, s, ok in reversed(samples) if not ok), 0.0)
+    return min(max(p95 * margin, last_timeout, 1.0), default * MAX_TIMEOUT_FACTOR)
+
+
+def print_timing_summary():
+    for transition, stat in sorted(get_timing_stats().items()):
+        if stat["mean"] is None:
+            print(f"{transition}: {stat['count']} waits, all timed out")
+        else:
+            print(f"{transition}: {stat['count']} waits, mean {stat['mean']:.1f}s, "
+                  f"p95 {stat['p95']:.1f}s, max {stat['max']:.1f}s, timeouts {stat['timeouts']}")
+
+
+def _load_history():
+    """Loads the last MAX_SAMPLES durations per transition recorded by previous runs."""
+    global _history_loaded, _log_rows
+    if _history_loaded:
+        return
+    _history_loaded = True
+    if not os.path.exists(TIMING_LOG_PATH):
+        return
+    try:
+        with open(TIMING_LOG_PATH, "r", newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                _log_rows += 1
+                if len(row) == 4:
+                    _durations[row[1]].append((int(row[0]), float(row[2]), row[3] == "1"))
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read timing log: {e}")
+
+
+def _log_row(transition, sample):
+    timestamp, seconds, reached = sample
+    return [timestamp, transition, f"{seconds:.3f}", int(reached)]
+
+
+def _compact_log():
+    """Rewrites TIMING_LOG_PATH with only the samples still kept in memory."""
+    global _log_rows
+    rows = sorted((sample[0], transition, sample) for transition, samples in _durations.items()
+                  for sample in samples)
+    tmp_path = TIMING_LOG_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(_log_row(transition, sample) for _, transition, sample in rows)
+        os.replace(tmp_path, TIMING_LOG_PATH)
+        _log_rows = len(rows)
+    except OSError as e:
+        print(f"Warning: Could not compact timing log: {e}")
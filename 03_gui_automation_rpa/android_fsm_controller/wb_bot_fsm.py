@@ -17,7 +17,7 @@ from enum import Enum
 # --- Path Setup ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils import ADBShell, img_utils
+from utils import ADBShell, img_utils, timing
 try:
     from config.config import SCREEN_SHOOT_SAVE_PATH, RES_PATH
 except ImportError:
@@ -28,6 +28,12 @@ except ImportError:
 PACKET_NAME = "com.linegames.dcglobal"
 DEFAULT_SCREENSHOT = os.path.join(SCREEN_SHOOT_SAVE_PATH, "screenshot.png")
 
+# Default upper bounds (seconds) for readiness waits; tuned from recorded waits by
+# timing.suggest_timeout() where each wait happens
+BATTLE_TIMEOUT = 800
+RESTART_TIMEOUT = 90
+WAKEUP_CLICK_MAX = 20
+
 # Template List
 TEMPLATE_NAMES = [
     "battle_start", "finished_boss", "confirm", "complete_battle", 
@@ -35,13 +41,10 @@ TEMPLATE_NAMES = [
     "enter_wb", "retry", "trial_ready", "buy_ticket_finished"
 ]
 
+# Template sizes are read on first use, not at import
 template_size = {}
-for tpl_name in TEMPLATE_NAMES:
-    path = os.path.join(RES_PATH, tpl_name + ".png")
-    tpl_img = cv2.imread(path)
-    if tpl_img is not None:
-        template_size[tpl_name] = tpl_img.shape[1::-1]
 
+# Connects to the device on its first command
 client = ADBShell.ADBShell()
 last_got_ticket_time = 0
 
@@ -53,26 +56,28 @@ class State(Enum):
     NO_TICKET = "Out of Tickets"
     UNKNOWN_STATE = "Unknown State"
 
-def block_until_template_exists(template, max_try=10, interval=0.5):
-    """Blocks execution until template appears."""
-    cnt = 0
-    while not is_template_in_screenshot(template):
-        cnt += 1
-        time.sleep(interval)
-        if cnt > max_try:
-            return False
-    return True
+def block_until_template_exists(template, timeout=6, interval=0.5, transition=None):
+    """Blocks execution until template appears or `timeout` seconds elapse."""
+    return timing.wait_until(
+        lambda: is_template_in_screenshot(template), timeout, interval,
+        transition or f"wb:wait:{template}"
+    )
+
+def wait_for_screen_settle(timeout=3, transition=None):
+    """Blocks until consecutive screenshots stop changing (animations finished)."""
+    return timing.wait_until_stable(read_screen, timeout, transition=transition)
 
 def transition_to_battle_prep():
     """Transition: WB List -> Battle Prep"""
     if block_until_template_exists("trial_ready"):
-        while not is_template_in_screenshot("battle_start"):
+        for _ in range(WAKEUP_CLICK_MAX):
+            if is_template_in_screenshot("battle_start"):
+                return State.IN_WB_BATTLE_PAGE
             # Anti-AFK / Wakeup clicks
             client.get_mouse_click_random([(863, 537), (197, 92)])
-            time.sleep(3)
-        return State.IN_WB_BATTLE_PAGE
-    else:
-        return State.UNKNOWN_STATE
+            if block_until_template_exists("battle_start", 3, transition="wb:list->battle_prep"):
+                return State.IN_WB_BATTLE_PAGE
+    return State.UNKNOWN_STATE
 
 def execute_battle_start():
     """Transition: Battle Prep -> In Battle"""
@@ -81,7 +86,7 @@ def execute_battle_start():
     else:
         return State.UNKNOWN_STATE
     
-    time.sleep(2)
+    wait_for_screen_settle(5, "wb:battle_prep->battle_start")
     if is_template_in_screenshot("buy_ticket"):
         return State.NO_TICKET
     elif is_template_in_screenshot("finished_boss"):
@@ -100,11 +105,9 @@ def handle_ticket_purchase():
         
         if is_template_in_screenshot("buy_ticket"):
             client.get_mouse_click_random(get_box("buy_ticket"))
-        time.sleep(2)
-        if is_template_in_screenshot("confirm_buy_ticket"):
+        if block_until_template_exists("confirm_buy_ticket", 4):
             client.get_mouse_click_random(get_box("confirm_buy_ticket"))
-        time.sleep(2)
-        if is_template_in_screenshot("buy_ticket_finished"):
+        if block_until_template_exists("buy_ticket_finished", 4):
             client.get_mouse_click_random(get_box("buy_ticket_finished"))
         return State.IN_WB_BATTLE_PAGE
     else:
@@ -113,18 +116,13 @@ def handle_ticket_purchase():
 
 def return_to_wb_list():
     """Transition: Main Menu -> WB List"""
-    max_try = 10
     if detect_current_state() == State.IN_MAINMENU:
-        while not is_template_in_screenshot("enter_wb"):
-            max_try -= 1
-            time.sleep(1)
-            if max_try <= 0:
-                restart_game()
-                return State.UNKNOWN_STATE
+        if not block_until_template_exists("enter_wb", 10):
+            restart_game()
+            return State.UNKNOWN_STATE
         
         client.get_mouse_click_random(get_box("enter_wb"))
-        time.sleep(3)
-        if is_template_in_screenshot("trial_ready"):
+        if block_until_template_exists("trial_ready", 6, transition="wb:main_menu->wb_list"):
             return State.IN_WB_LIST
         return State.UNKNOWN_STATE
     else:
@@ -132,23 +130,19 @@ def return_to_wb_list():
         return State.UNKNOWN_STATE
 
 def wait_for_battle_completion():
-    """Monitors battle progress."""
-    cnt_wait = 0
-    time.sleep(300) # Minimum battle time
-    
-    while not (is_template_in_screenshot("complete_battle") or is_template_in_screenshot("complete_battle_all")):
-        time.sleep(10)
-        cnt_wait += 1
-        if cnt_wait > 50:
-            print("Battle timed out.")
-            return State.UNKNOWN_STATE
+    """Monitors battle progress, returning as soon as the result screen appears."""
+    battle_done = lambda: is_template_in_screenshot("complete_battle") or is_template_in_screenshot("complete_battle_all")
+    timeout = timing.suggest_timeout("wb:battle", BATTLE_TIMEOUT)
+    if not timing.wait_until(battle_done, timeout, interval=10, transition="wb:battle"):
+        print("Battle timed out.")
+        return State.UNKNOWN_STATE
             
     if is_template_in_screenshot("complete_battle"):
         print("Battle finished.")
         client.get_mouse_click_random(get_box("retry"))
         # Wait until transition back to list
-        while detect_current_state() == State.IN_WB_LIST:
-             time.sleep(1)
+        timing.wait_until(lambda: detect_current_state() != State.IN_WB_LIST, 30, interval=1,
+                          transition="wb:result->wb_list")
     elif is_template_in_screenshot("complete_battle_all"):
         client.get_mouse_click_random(get_box("complete_battle_all"))
         
@@ -160,7 +154,18 @@ def get_box(template, is_light_judging=True):
     loc = img_utils.match_tpl_loc(DEFAULT_SCREENSHOT, os.path.join(RES_PATH, template + ".png"), is_light_judging=is_light_judging)
     if loc == [-1, -1]:
         return [[0,0], [0,0]]
-    return [loc, template_size.get(template, [0,0])]
+    return [loc, get_template_size(template)]
+
+def get_template_size(template):
+    """(width, height) of a template, [0, 0] if it is missing; cached after the first read."""
+    if template not in template_size:
+        tpl_img = cv2.imread(os.path.join(RES_PATH, template + ".png"))
+        template_size[template] = tpl_img.shape[1::-1] if tpl_img is not None else [0, 0]
+    return template_size[template]
+
+def read_screen():
+    client.get_screen_shot()
+    return cv2.imread(DEFAULT_SCREENSHOT, 0)
 
 def is_template_in_screenshot(template_name):
     client.get_screen_shot()
@@ -179,13 +184,17 @@ def is_template_in_screenshot(template_name):
 def restart_game():
     print("Self-Healing: Restarting Game Client...")
     client.stop_app(PACKET_NAME)
-    time.sleep(2)
     client.start_app(PACKET_NAME + "/com.NextFloor.DestinyChild.MainActivity")
-    time.sleep(30)
-    while detect_current_state() != State.IN_MAINMENU:
+
+    def at_main_menu():
+        if detect_current_state() == State.IN_MAINMENU:
+            return True
         client.get_mouse_click_random(((900, 400), (110, 195))) # Dismiss Ads
-        time.sleep(2)
-    time.sleep(6)
+        return False
+
+    timeout = timing.suggest_timeout("wb:restart->main_menu", RESTART_TIMEOUT)
+    timing.wait_until(at_main_menu, timeout, interval=2, transition="wb:restart->main_menu")
+    wait_for_screen_settle(6, "wb:main_menu_settle")
 
 def detect_current_state():
     """State Identification Routine."""
@@ -199,10 +208,26 @@ def detect_current_state():
     else:
         return State.UNKNOWN_STATE
 
+def check_setup():
+    """--dry-run: reports what a real run would trip over, without touching the device."""
+    problems = ["Missing template {}".format(os.path.join(RES_PATH, name + ".png"))
+                for name in TEMPLATE_NAMES if not os.path.exists(os.path.join(RES_PATH, name + ".png"))]
+    problems += ADBShell.ADBShell.setup_problems()
+    print(f"Timeouts: battle {timing.suggest_timeout('wb:battle', BATTLE_TIMEOUT):.0f}s, "
+          f"restart {timing.suggest_timeout('wb:restart->main_menu', RESTART_TIMEOUT):.0f}s")
+    for problem in problems:
+        print("[-] " + problem)
+    if not problems:
+        print("[+] Setup OK.")
+    return not problems
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="World Boss Bot")
     parser.add_argument("-n", type=int, default=None, help="Number of tickets to use")
+    parser.add_argument("--dry-run", action='store_true', help="Check templates and adb setup, then exit")
     args = parser.parse_args()
+    if args.dry_run:
+        sys.exit(0 if check_setup() else 1)
     
     if args.n is None:
         try:
@@ -219,7 +244,7 @@ if __name__ == '__main__':
     
     # Main FSM Loop
     while ticket_cnt < ticket_limit:
-        time.sleep(2)
+        wait_for_screen_settle(2)
         print(f"State: {current_state.value}")
         
         if current_state == State.IN_MAINMENU:
@@ -235,4 +260,6 @@ if __name__ == '__main__':
             current_state = handle_ticket_purchase()
         elif current_state == State.UNKNOWN_STATE:
             restart_game()
-            current_state = State.IN_MAINMENU
\ No newline at end of file
+            current_state = State.IN_MAINMENU
+
+    timing.print_timing_summary()
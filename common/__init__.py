@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers for the scraping and monitoring tools (HTTP caching, concurrent fetching)."""
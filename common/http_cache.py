@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed On-disk HTTP Cache
+
+Description:
+    Shared response cache for the scrapers. Entries are keyed by a hash of the
+    normalized URL and request headers; bodies are stored once per content hash
+    (identical pages share one blob). An SQLite index tracks entries for TTL and
+    size-based LRU eviction. Eviction runs when the blobs written outgrow
+    max_bytes, or every EVICT_EVERY puts for expired entries, and removes
+    the blobs of evicted entries by hash.
+
+    Offline mode only reads from the cache (ignoring TTL) and raises CacheMiss
+    instead of touching the network, so parsing/export can be re-run and
+    benchmarked without connectivity.
+
+Layout:
+    <cache_dir>/index.sqlite3
+    <cache_dir>/objects/<sha256[:2]>/<sha256>
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Puts between expiry sweeps when the cache is below max_bytes
+EVICT_EVERY = 500
+# LRU eviction frees space down to this share of max_bytes, so it does not run again on the next put
+EVICT_LOW_WATER = 0.9
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a request is not in the cache."""
+
+
+class CachedResponse(object):
+    """Minimal requests.Response look-alike returned by HttpCache.fetch."""
+    def __init__(self, url, status_code, headers, content, from_cache):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError("HTTP {} for {}".format(self.status_code, self.url), response=self)
+
+
+def normalize_url(url):
+    """Lowercases scheme/host, drops default ports and fragments, and sorts query parameters."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = "{}:{}".format(host, parts.port)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def cache_key(url, headers=None, method='GET'):
+    normalized_headers = sorted((k.strip().lower(), str(v).strip()) for k, v in (headers or {}).items())
+    raw = json.dumps([method.upper(), normalize_url(url), normalized_headers])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def default_fetcher(url, headers):
+    import requests
+    return requests.get(url, headers=headers, timeout=30)
+
+
+class HttpCache(object):
+    def __init__(self, cache_dir, ttl=24 * 3600, max_bytes=512 * 1024 * 1024, offline=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), check_same_thread=False)
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL,"
+            " body_hash TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS entries_body_hash ON entries (body_hash)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self.__conn.commit()
+        self.__stored_bytes = self.__blob_bytes()
+        self.__puts_since_evict = 0
+
+    def fetch(self, url, headers=None, fetcher=None):
+        """
+        Returns a cached response if a fresh entry exists, else calls
+        `fetcher(url, headers)` (a requests-style response), stores 2xx results and returns them.
+        """
+        cached = self.get(url, headers)
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise CacheMiss(url)
+        response = (fetcher or default_fetcher)(url, headers)
+        if 200 <= response.status_code < 300:
+            self.put(url, headers, response.status_code, dict(response.headers), response.content)
+        return CachedResponse(url, response.status_code, dict(response.headers), response.content, False)
+
+    def get(self, url, headers=None):
+        key = cache_key(url, headers)
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT status, headers, body_hash, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (not self.offline and time.time() - row[3] > self.ttl):
+                self.misses += 1
+                return None
+            try:
+                with open(self.__object_path(row[2]), 'rb') as f:
+                    content = f.read()
+            except OSError:
+                self.__conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.__conn.commit()
+                self.misses += 1
+                return None
+            self.__conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.__conn.commit()
+            self.hits += 1
+        return CachedResponse(url, row[0], json.loads(row[1]), content, True)
+
+    def put(self, url, headers, status, response_headers, content):
+        key = cache_key(url, headers)
+        body_hash = hashlib.sha256(content).hexdigest()
+        path = self.__object_path(body_hash)
+        with self.__lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+                self.__stored_bytes += len(content)
+            old = self.__conn.execute("SELECT body_hash FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO entries (key, url, status, headers, body_hash, size, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), status, json.dumps(response_headers), body_hash, len(content), now, now)
+            )
+            self.__conn.commit()
+            if old is not None and old[0] != body_hash:
+                # The entry's previous body may now be unreferenced
+                self.__remove_blobs([old[0]])
+            self.__puts_since_evict += 1
+            if self.__stored_bytes > self.max_bytes or self.__puts_since_evict >= EVICT_EVERY:
+                self.__evict_locked()
+
+    def evict(self):
+        with self.__lock:
+            self.__evict_locked()
+
+    def __evict_locked(self):
+        """Drops expired entries, then least recently used ones until blobs fit in max_bytes (with headroom)."""
+        conn = self.__conn
+        self.__puts_since_evict = 0
+        evicted = []
+        if not self.offline:
+            cutoff = time.time() - self.ttl
+            evicted += [row[0] for row in conn.execute(
+                "SELECT DISTINCT body_hash FROM entries WHERE stored_at < ?", (cutoff,))]
+            conn.execute("DELETE FROM entries WHERE stored_at < ?", (cutoff,))
+        total = self.__blob_bytes()
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_LOW_WATER
+            for key, body_hash, size in conn.execute(
+                    "SELECT key, body_hash, size FROM entries ORDER BY accessed_at").fetchall():
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                evicted.append(body_hash)
+                if conn.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is None:
+                    total -= size
+                if total <= target:
+                    break
+        conn.commit()
+        self.__remove_blobs(evicted)
+        self.__stored_bytes = self.__blob_bytes()
+
+    def __blob_bytes(self):
+        """Blob bytes on disk: each content hash counted once."""
+        return self.__conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)").fetchone()[0]
+
+    def __remove_blobs(self, body_hashes):
+        """Deletes the blobs of `body_hashes` that no entry references any more."""
+        for body_hash in set(body_hashes):
+            if self.__conn.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+                continue
+            path = self.__object_path(body_hash)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.__stored_bytes -= size
+            except OSError:
+                pass
+
+    def __object_path(self, body_hash):
+        return os.path.join(self.cache_dir, 'objects', body_hash[:2], body_hash)
+
+    def close(self):
+        self.__conn.close()
@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+import requests
+
+from common.http_cache import HttpCache, CacheMiss, normalize_url
+
+
+class FakeResponse(object):
+    def __init__(self, content, status_code=200):
+        self.status_code = status_code
+        self.headers = {'Content-Type': 'text/html'}
+        self.content = content
+
+
+class FakeFetcher(object):
+    """Serves fixed bodies by URL and counts the requests that reach it."""
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = 0
+
+    def __call__(self, url, headers):
+        self.calls += 1
+        content, status = self.pages[url]
+        return FakeResponse(content, status)
+
+
+def blob_count(cache_dir):
+    return sum(len(files) for _, _, files in os.walk(os.path.join(cache_dir, 'objects')))
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&a=1#top") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_fetch_serves_hits_and_stores_only_success(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    fetcher = FakeFetcher({'http://a/1': (b'one', 200), 'http://a/err': (b'down', 503)})
+    assert cache.fetch('http://a/1', fetcher=fetcher).from_cache is False
+    response = cache.fetch('http://a/1', fetcher=fetcher)
+    assert (response.from_cache, response.content, fetcher.calls) == (True, b'one', 1)
+
+    cache.fetch('http://a/err', fetcher=fetcher)
+    cache.fetch('http://a/err', fetcher=fetcher)
+    assert fetcher.calls == 3
+    cache.close()
+
+
+def test_identical_bodies_share_one_blob(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    cache.put('http://a/1', None, 200, {}, b'same body')
+    cache.put('http://a/2', None, 200, {}, b'same body')
+    assert blob_count(str(tmp_path)) == 1
+    assert cache.get('http://a/2').content == b'same body'
+    cache.close()
+
+
+def test_replaced_entry_removes_its_old_blob(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    cache.put('http://a/1', None, 200, {}, b'old')
+    cache.put('http://a/1', None, 200, {}, b'new')
+    assert blob_count(str(tmp_path)) == 1
+    assert cache.get('http://a/1').content == b'new'
+    cache.close()
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=350)
+    for i in range(3):
+        cache.put('http://a/{}'.format(i), None, 200, {}, bytes([i]) * 100)
+        time.sleep(0.01)
+    # Touch the oldest entry so the second one is least recently used
+    assert cache.get('http://a/0') is not None
+    time.sleep(0.01)
+    cache.put('http://a/3', None, 200, {}, b'x' * 100)
+
+    assert cache.get('http://a/1') is None
+    assert cache.get('http://a/0') is not None
+    assert cache.get('http://a/3') is not None
+    # The evicted entry's blob is gone from disk
+    assert blob_count(str(tmp_path)) == 3
+    cache.close()
+
+
+def test_expired_entries_are_misses_and_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=0.05)
+    fetcher = FakeFetcher({'http://a/1': (b'one', 200)})
+    cache.fetch('http://a/1', fetcher=fetcher)
+    time.sleep(0.1)
+    assert cache.get('http://a/1') is None
+    cache.evict()
+    assert blob_count(str(tmp_path)) == 0
+    cache.fetch('http://a/1', fetcher=fetcher)
+    assert fetcher.calls == 2
+    cache.close()
+
+
+def test_offline_serves_stale_entries_and_raises_on_misses(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=0.05)
+    cache.put('http://a/1', None, 200, {}, b'one')
+    cache.close()
+    time.sleep(0.1)
+
+    cache = HttpCache(str(tmp_path), ttl=0.05, offline=True)
+    fetcher = FakeFetcher({})
+    assert cache.fetch('http://a/1', fetcher=fetcher).content == b'one'
+    with pytest.raises(CacheMiss):
+        cache.fetch('http://a/2', fetcher=fetcher)
+    assert fetcher.calls == 0
+    cache.close()
+
+
+def test_raise_for_status_raises_requests_error(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    response = cache.fetch('http://a/err', fetcher=FakeFetcher({'http://a/err': (b'down', 503)}))
+    with pytest.raises(requests.HTTPError) as error:
+        response.raise_for_status()
+    assert error.value.response is response
+    cache.close()